@@ -0,0 +1,49 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import time
+from spikes import datacollector as dc
+from spikes import utils as sputils
+from tests import standin
+
+
+def collect(responder, latency, workers, nsgns, ndays):
+    with standin.replay(responder, latency=latency) as cls:
+        start = time.time()
+        for product in sputils.get_products():
+            dc.get_sgns_by_install_time(sputils.get_channels(),
+                                        product=product,
+                                        ndays=ndays,
+                                        N=100,
+                                        workers=workers)
+        return time.time() - start, cls.nrequests
+
+
+if __name__ == '__main__':
+    description = 'Benchmark the collection of the crash numbers'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-r', '--recording', dest='recording',
+                        action='store', default='',
+                        help='recorded responses (default: synthetic ones)')
+    parser.add_argument('-l', '--latency', dest='latency', type=float,
+                        action='store', default=0.2,
+                        help='latency in seconds of each query')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        action='store', default=8, help='concurrent queries')
+    parser.add_argument('-n', '--nsgns', dest='nsgns', type=int,
+                        action='store', default=5000, help='signatures')
+    parser.add_argument('-d', '--ndays', dest='ndays', type=int,
+                        action='store', default=11, help='number of days')
+    args = parser.parse_args()
+
+    if args.recording:
+        responder = standin.Recording.load(args.recording)
+    else:
+        responder = standin.Synthetic(nsgns=args.nsgns)
+
+    for workers in [1, args.workers]:
+        t, n = collect(responder, args.latency, workers,
+                       args.nsgns, args.ndays)
+        print('workers: {}, queries: {}, time: {:.2f}s'.format(workers, n, t))
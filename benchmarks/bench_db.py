@@ -0,0 +1,109 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import datetime
+import time
+import numpy as np
+from spikes import app, db
+from spikes import models
+from spikes import utils as sputils
+from spikes.models import Signatures
+
+
+def get_pcs():
+    return [(p, c) for p in sputils.get_products()
+            for c in sputils.get_channels()]
+
+
+def seed(ndays, nsgns, end, seed=0):
+    """Create a signatures table without the indexes and fill it
+
+    Args:
+        ndays (int): the number of days of data
+        nsgns (int): the number of signatures by (product, channel) and day
+        end (datetime.date): the last day
+        seed (int): the random seed
+    """
+    rs = np.random.RandomState(seed)
+    table = Signatures.__table__
+    table.drop(db.engine, checkfirst=True)
+    table.create(db.engine)
+    for index in table.indexes:
+        index.drop(db.engine)
+
+    for i in range(ndays):
+        date = end - datetime.timedelta(days=i)
+        rows = []
+        for product, channel in get_pcs():
+            pc = Signatures.get_pc(product, channel)
+            numbers = rs.poisson(100, (nsgns, models.NDAYS)).tolist()
+            for j in range(nsgns):
+                bug = {'resolved': None, 'unresolved': None}
+                rows.append(Signatures.get_row(pc, '', date,
+                                               'sgn{}'.format(j),
+                                               numbers[j], bug))
+        # some duplicates (the migration must remove them)
+        rows += rows[:5]
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+
+def query(ndays, end, nqueries, seed=0):
+    rs = np.random.RandomState(seed)
+    pcs = get_pcs()
+    times = {'get': 0., 'get signature': 0., 'listdates': 0.}
+    for _ in range(nqueries):
+        product, channel = pcs[rs.randint(len(pcs))]
+        date = end - datetime.timedelta(days=int(rs.randint(ndays)))
+
+        start = time.time()
+        Signatures.get(product, channel, date)
+        times['get'] += time.time() - start
+
+        start = time.time()
+        Signatures.get(product, channel, date, sgn='sgn1')
+        times['get signature'] += time.time() - start
+
+    start = time.time()
+    Signatures.listdates()
+    times['listdates'] += time.time() - start
+
+    times['get'] /= nqueries
+    times['get signature'] /= nqueries
+
+    return times
+
+
+if __name__ == '__main__':
+    description = 'Benchmark the queries on the signatures table ' \
+                  '(DATABASE_URL must be a PostgreSQL db, the table ' \
+                  'is dropped)'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-d', '--ndays', dest='ndays', type=int,
+                        action='store', default=90, help='days of data')
+    parser.add_argument('-n', '--nsgns', dest='nsgns', type=int,
+                        action='store', default=100,
+                        help='signatures by product, channel and day')
+    parser.add_argument('-q', '--nqueries', dest='nqueries', type=int,
+                        action='store', default=50, help='queries')
+    args = parser.parse_args()
+
+    end = datetime.date(2018, 1, 1)
+    with app.app_context():
+        start = time.time()
+        seed(args.ndays, args.nsgns, end)
+        print('seed: {:.2f}s'.format(time.time() - start))
+
+        before = query(args.ndays, end, args.nqueries)
+
+        start = time.time()
+        models.migrate(db.engine)
+        print('migrate: {:.2f}s'.format(time.time() - start))
+
+        after = query(args.ndays, end, args.nqueries)
+
+        for name in sorted(before):
+            print('{}: no index: {:.2f}ms, indexes: {:.2f}ms'.format(
+                name, 1000 * before[name], 1000 * after[name]))
@@ -0,0 +1,43 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import os
+import tempfile
+import time
+from spikes import replay
+from tests import standin
+
+
+def bench(path, **params):
+    start = time.perf_counter()
+    data = replay.load(path)
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    res = replay.replay(data, **params)
+    replayed = time.perf_counter() - start
+    return len(res), loaded, replayed
+
+
+if __name__ == '__main__':
+    description = 'Benchmark the spike detection on dumped data'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-f', '--file', dest='file', action='store',
+                        default='', help='data dumped by spikes.replay '
+                        '(default: a week of synthetic data)')
+    parser.add_argument('-n', '--nsgns', dest='nsgns', type=int,
+                        action='store', default=1000,
+                        help='signatures in the synthetic data')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.file
+        if not path:
+            path = os.path.join(tmp, 'data.npz')
+            with standin.replay(standin.Synthetic(nsgns=args.nsgns)):
+                replay.dump(path, '2020-03-09', end='2020-03-15')
+        ndates, loaded, replayed = bench(path)
+        print('size: {} bytes, dates: {}, load: {:.3f}s, '
+              'replay: {:.3f}s'.format(os.path.getsize(path), ndates,
+                                       loaded, replayed))
@@ -0,0 +1,82 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import asyncio
+import time
+from unittest import mock
+from urllib.parse import urlencode
+from libmozdata import socorro
+from spikes import aiocollector as aio
+from spikes import config
+from spikes import datacollector as dc
+from spikes import utils as sputils
+from tests import server, standin
+
+
+def fixed_chunks(params, signatures, max_length, max_size):
+    # the chunks of 10 signatures used before
+    return [signatures[i:i + 10] for i in range(0, len(signatures), 10)]
+
+
+def collect(responder, latency, workers, sgns_by_chan, fail):
+    async def run(s):
+        async with aio.Session(workers=workers,
+                               socorro_url=s.socorro_url,
+                               bugzilla_url=s.bugzilla_url) as session:
+            return await aio.get_sgns_info(session, sgns_by_chan,
+                                           date='2020-03-15')
+
+    with server.serve(responder, latency=latency, fail=fail) as s:
+        start = time.time()
+        res = asyncio.run(run(s))
+        return res, time.time() - start, s.nrequests
+
+
+if __name__ == '__main__':
+    description = 'Benchmark the chunks of signatures in get_sgns_info'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-l', '--latency', dest='latency', type=float,
+                        action='store', default=0.2,
+                        help='latency in seconds of each query')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        action='store', default=8, help='concurrent queries')
+    parser.add_argument('-n', '--nsgns', dest='nsgns', type=int,
+                        action='store', default=500,
+                        help='signatures by channel')
+    parser.add_argument('-b', '--bad', dest='bad', type=int,
+                        action='store', default=2,
+                        help='signatures failing the queries')
+    args = parser.parse_args()
+
+    responder = standin.Synthetic(nsgns=args.nsgns)
+    sgns = responder.signatures
+    sgns_by_chan = {chan: sgns for chan in sputils.get_channels()}
+    max_length = config.get_max_url_length()
+
+    def get_fail(bad):
+        def fail(path, params):
+            # a too long url and a bad request for the bad signatures
+            query = urlencode(params, doseq=True)
+            if len(socorro.SuperSearch.URL) + 1 + len(query) > max_length:
+                return 414
+            return 400 if bad & set(standin.Synthetic.as_list(
+                params.get('signature'))) else False
+        return fail
+
+    step = max(1, args.nsgns // max(1, args.bad))
+    bad = set(sgns[1::step][:args.bad])
+    scenarios = [('no failure', None)]
+    if bad:
+        scenarios.append(('{} bad signatures'.format(len(bad)),
+                          get_fail({'=' + s for s in bad})))
+    for scenario, fail in scenarios:
+        for name, chunks in [('fixed', fixed_chunks),
+                             ('adaptive', dc.get_chunks)]:
+            with mock.patch.object(dc, 'get_chunks', chunks):
+                res, t, n = collect(responder, args.latency, args.workers,
+                                    sgns_by_chan, fail)
+            nsgns = sum(len(x) for x in res.values())
+            print('{}, {} chunks: queries: {}, time: {:.2f}s, '
+                  'signatures: {}'.format(scenario, name, n, t, nsgns))
@@ -0,0 +1,66 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import re
+import time
+from spikes import config
+
+
+def get_skiplist(npats):
+    pats = []
+    for i in range(npats):
+        if i % 2:
+            pats.append('^mozilla::ipc::Func{} \\| .*$'.format(i))
+        else:
+            pats.append('^OOM \\| module{}\\.dll$'.format(i))
+    return [re.compile(p) for p in pats]
+
+
+def get_signatures(nsgns):
+    sgns = []
+    for i in range(nsgns):
+        if i % 50 == 0:
+            sgns.append('OOM | module{}.dll'.format(2 * (i % 100)))
+        else:
+            sgns.append('mozilla::dom::Func{} | foo::bar'.format(i))
+    return sgns
+
+
+def bench(npats, nsgns, ndays, nchannels):
+    patterns = get_skiplist(npats)
+    sgns = get_signatures(nsgns)
+
+    start = time.time()
+    for _ in range(ndays * nchannels):
+        for sgn in sgns:
+            any(p.match(sgn) for p in patterns)
+    loop = time.time() - start
+
+    skipper = config.Skipper(patterns)
+    start = time.time()
+    for _ in range(ndays * nchannels):
+        for sgn in sgns:
+            skipper(sgn)
+    compiled = time.time() - start
+
+    return loop, compiled
+
+
+if __name__ == '__main__':
+    description = 'Benchmark the skiplist matching'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-p', '--npats', dest='npats', type=int, nargs='+',
+                        action='store', default=[3, 100, 300],
+                        help='numbers of patterns')
+    parser.add_argument('-n', '--nsgns', dest='nsgns', type=int,
+                        action='store', default=5000, help='signatures')
+    parser.add_argument('-d', '--ndays', dest='ndays', type=int,
+                        action='store', default=12, help='number of days')
+    args = parser.parse_args()
+
+    for npats in args.npats:
+        loop, compiled = bench(npats, args.nsgns, args.ndays, 3)
+        print('patterns: {}, any: {:.4f}s, '
+              'compiled and memoized: {:.4f}s'.format(npats, loop, compiled))
@@ -0,0 +1,49 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import time
+import numpy as np
+from spikes import tools
+
+
+def get_numbers(R, C, seed=0):
+    rs = np.random.RandomState(seed)
+    base = rs.zipf(1.5, size=R).clip(0, 10000)
+    x = rs.poisson(base[:, None] * rs.uniform(0.5, 1.5, (R, C)))
+    x[rs.randint(0, R, max(1, R // 100)), -1] *= 5
+    return x.astype(np.int32)
+
+
+def bench(R, C, coeff=3., winmin=7, winmax=11):
+    x = get_numbers(R, C)
+    globalstats = tools.get_global({i: n for i, n in enumerate(x)},
+                                   coeff, winmin, winmax)
+
+    start = time.time()
+    for numbers in x:
+        tools.is_sgn_spiking(numbers, globalstats, coeff, winmin, winmax)
+    loop = time.time() - start
+
+    start = time.time()
+    tools.are_sgns_spiking(x, globalstats, coeff, winmin, winmax)
+    batched = time.time() - start
+
+    return loop, batched
+
+
+if __name__ == '__main__':
+    description = 'Benchmark the spike detection for the signatures'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-n', '--nsgns', dest='nsgns', type=int, nargs='+',
+                        action='store', default=[1000, 5000, 10000],
+                        help='numbers of signatures')
+    parser.add_argument('-d', '--ndays', dest='ndays', type=int,
+                        action='store', default=12, help='number of days')
+    args = parser.parse_args()
+
+    for R in args.nsgns:
+        loop, batched = bench(R, args.ndays)
+        print('signatures: {}, is_sgn_spiking: {:.4f}s, '
+              'are_sgns_spiking: {:.4f}s'.format(R, loop, batched))
@@ -0,0 +1,99 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import time
+import numpy as np
+from spikes import tools
+
+
+def get_series(L, seed=0):
+    rs = np.random.RandomState(seed)
+    x = rs.poisson(rs.uniform(10, 1000), L).astype(np.float64)
+    x[rs.randint(0, L, max(1, L // 20))] *= 3
+    return x
+
+
+def generic_mean(x):
+    # not tools.mean: multimoving uses the generic way
+    return tools.mean(x)
+
+
+def bench_multimoving(L, coeff=4.):
+    x = get_series(L)
+
+    start = time.time()
+    tools.multimoving(x, f=generic_mean, coeff=coeff)
+    generic = time.time() - start
+
+    start = time.time()
+    tools.multimoving(x, coeff=coeff)
+    running = time.time() - start
+
+    return generic, running
+
+
+def bench_multimoving_rows(L, nrows, coeff=4.):
+    x = np.array([get_series(L, seed=i) for i in range(nrows)])
+
+    start = time.time()
+    for row in x:
+        tools.multimoving(row, coeff=coeff)
+    rows = time.time() - start
+
+    start = time.time()
+    tools.multimoving(x, coeff=coeff)
+    batched = time.time() - start
+
+    return rows, batched
+
+
+def bench_esd(nsgns, nwins=5, seed=0):
+    rs = np.random.RandomState(seed)
+    x = rs.poisson(rs.uniform(10, 1000), (nwins, nsgns)).astype(np.float64)
+    x[:, rs.randint(0, nsgns, nsgns // 100)] *= 5
+
+    start = time.time()
+    for row in x:
+        tools.generalized_esd(row.copy(), 10, method='median')
+    median = time.time() - start
+
+    start = time.time()
+    for row in x:
+        tools.generalized_esd(row.copy(), 10)
+    rows = time.time() - start
+
+    start = time.time()
+    tools.generalized_esd_rows(x, 10)
+    batched = time.time() - start
+
+    return median, rows, batched
+
+
+if __name__ == '__main__':
+    description = 'Benchmark the statistics kernels of spikes.tools'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-l', '--lengths', dest='lengths', type=int,
+                        nargs='+', action='store', default=[12, 60, 175],
+                        help='lengths of the series')
+    parser.add_argument('-n', '--nsgns', dest='nsgns', type=int,
+                        nargs='+', action='store', default=[500, 5000],
+                        help='numbers of signatures')
+    args = parser.parse_args()
+
+    for L in args.lengths:
+        generic, running = bench_multimoving(L)
+        print('multimoving: length: {}, generic: {:.4f}s, '
+              'running sums: {:.4f}s'.format(L, generic, running))
+
+    for L in args.lengths:
+        rows, batched = bench_multimoving_rows(L, 50)
+        print('multimoving: length: {}, 50 rows: {:.4f}s, '
+              'batched: {:.4f}s'.format(L, rows, batched))
+
+    for nsgns in args.nsgns:
+        median, rows, batched = bench_esd(nsgns)
+        print('esd: signatures: {}, median (generic): {:.4f}s, '
+              'mean: {:.4f}s, mean batched: {:.4f}s'.format(nsgns, median,
+                                                            rows, batched))
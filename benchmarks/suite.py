@@ -0,0 +1,205 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import time
+from unittest import mock
+import numpy as np
+from libmozdata import socorro
+from libmozdata.bugzilla import Bugzilla
+from spikes import datacollector as dc
+from spikes import tools
+from spikes.counts import Counts
+from spikes.gather import gather, get_key
+from tests import server, standin
+
+
+NDAYS = [12, 60, 180]
+NSGNS = [100, 1000, 10000]
+
+
+def get_numbers(nsgns, ndays, seed=0):
+    rs = np.random.RandomState(seed)
+    base = rs.zipf(1.5, size=nsgns).clip(0, 10000)
+    x = rs.poisson(base[:, None] * rs.uniform(0.5, 1.5, (nsgns, ndays)))
+    x[rs.randint(0, nsgns, max(1, nsgns // 100)), -1] *= 5
+    return x.astype(np.int32)
+
+
+def get_counts(nsgns, ndays, seed=0):
+    # a third of the signatures only differ by an address
+    sgns = ['sgn{} | 0x{:x}'.format(i // 3, i) if i % 3 else 'sgn{}'.format(i)
+            for i in range(nsgns)]
+    return Counts.from_rows(list(range(ndays)), sgns,
+                            get_numbers(nsgns, ndays, seed=seed))
+
+
+def get_series(ndays, seed=0):
+    return get_numbers(1, ndays, seed=seed)[0].astype(np.float64) * 100.
+
+
+def kernels(ndays, nsgns, series=True):
+    """Get the kernels to benchmark for a dataset
+
+    Args:
+        ndays (int): the number of days
+        nsgns (int): the number of signatures
+        series (bool): if True, add the kernels for a single series
+
+    Returns:
+        list[tuple]: (name, function to time), the functions have no args
+    """
+    x = get_numbers(nsgns, ndays)
+    stats = Counts.from_rows(list(range(ndays)), range(nsgns), x)
+    globalstats = tools.get_global(stats, 3., 7, 11)
+    ratios = x[:, -1] / np.maximum(x[:, -8:-1].mean(axis=1), 1.)
+    counts = get_counts(nsgns, ndays)
+    rows = np.arange(nsgns)
+
+    def gather_counts():
+        # gather modifies the counts (and the keys are memoized)
+        get_key.cache_clear()
+        gather(counts.take(rows))
+
+    def is_sgn_spiking():
+        for numbers in x:
+            tools.is_sgn_spiking(numbers, globalstats, 3., 7, 11)
+
+    res = [('get_global', lambda: tools.get_global(stats, 3., 7, 11)),
+           ('are_sgns_spiking',
+            lambda: tools.are_sgns_spiking(x, globalstats, 3., 7, 11)),
+           ('is_sgn_spiking', is_sgn_spiking),
+           ('generalized_esd', lambda: tools.generalized_esd(ratios, 10)),
+           ('gather', gather_counts),
+           ('get_top_signatures',
+            lambda: dc.get_top_signatures(stats, 'Firefox', 'nightly',
+                                          N=100))]
+    if series:
+        # these ones don't depend on the number of signatures
+        y = get_series(ndays)
+        res += [('multimoving', lambda: tools.multimoving(y, coeff=4.)),
+                ('is_spiking', lambda: tools.is_spiking(y, coeff=4.))]
+    return res
+
+
+def timeit(f, repeat):
+    """Get the best time of several runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_update(responder, latency, date):
+    """Time models.update against a stand-in server (a db is needed)
+
+    The first update fills the caches, the second one uses them.
+
+    Returns:
+        dict: the times of the cold and of the warm update
+    """
+    from spikes import app, db, models
+
+    res = {}
+    with server.serve(responder, latency=latency) as s, \
+        mock.patch.object(socorro.Socorro, 'API_URL', s.socorro_url), \
+        mock.patch.object(Bugzilla, 'API_URL', s.bugzilla_url), \
+            app.app_context():
+        db.create_all()
+        for name in ['update cold', 'update warm']:
+            start = time.perf_counter()
+            models.update(date=date, asynchronous=True)
+            res[name] = time.perf_counter() - start
+    return res
+
+
+def get_revision():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                      stderr=subprocess.DEVNULL)
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run(ndays, nsgns, repeat, update=False, recording='', latency=0.):
+    results = []
+    for d in ndays:
+        for n in nsgns:
+            for name, f in kernels(d, n, series=n == nsgns[0]):
+                t = timeit(f, repeat)
+                results.append({'name': name, 'ndays': d,
+                                'nsgns': n, 'time': t})
+                print('{}: days: {}, signatures: {}, '
+                      'time: {:.6f}s'.format(name, d, n, t))
+
+    if update:
+        if recording:
+            responder = standin.Recording.load(recording)
+        else:
+            responder = standin.Synthetic(nsgns=max(nsgns))
+        for name, t in bench_update(responder, latency,
+                                    '2020-03-15').items():
+            results.append({'name': name, 'ndays': 0,
+                            'nsgns': max(nsgns), 'time': t})
+            print('{}: time: {:.6f}s'.format(name, t))
+
+    return {'revision': get_revision(),
+            'date': datetime.datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'repeat': repeat,
+            'results': results}
+
+
+def compare(old, new):
+    """Print the ratios new time / old time"""
+    old = {(r['name'], r['ndays'], r['nsgns']): r['time']
+           for r in old['results']}
+    for r in new['results']:
+        key = (r['name'], r['ndays'], r['nsgns'])
+        if key in old and old[key]:
+            print('{}: days: {}, signatures: {}, {:.6f}s -> {:.6f}s '
+                  '(x{:.2f})'.format(*key, old[key], r['time'],
+                                     r['time'] / old[key]))
+
+
+if __name__ == '__main__':
+    description = 'Run the benchmark suite and save the results in JSON'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-d', '--ndays', dest='ndays', type=int, nargs='+',
+                        action='store', default=NDAYS, help='numbers of days')
+    parser.add_argument('-n', '--nsgns', dest='nsgns', type=int, nargs='+',
+                        action='store', default=NSGNS,
+                        help='numbers of signatures')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int,
+                        action='store', default=3, help='runs by benchmark')
+    parser.add_argument('-o', '--output', dest='output', action='store',
+                        default='', help='JSON file for the results')
+    parser.add_argument('-c', '--compare', dest='compare', action='store',
+                        default='', help='JSON results to compare with')
+    parser.add_argument('-u', '--update', dest='update', action='store_true',
+                        help='time models.update too (needs DATABASE_URL)')
+    parser.add_argument('--recording', dest='recording', action='store',
+                        default='', help='recorded responses for the update '
+                        '(default: synthetic ones)')
+    parser.add_argument('-l', '--latency', dest='latency', type=float,
+                        action='store', default=0.,
+                        help='latency in seconds of each query')
+    args = parser.parse_args()
+
+    res = run(args.ndays, args.nsgns, args.repeat, update=args.update,
+              recording=args.recording, latency=args.latency)
+    if args.output:
+        with open(args.output, 'w') as Out:
+            json.dump(res, Out, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as In:
+            compare(json.load(In), res)
@@ -0,0 +1,21 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+from spikes import models
+
+
+if __name__ == '__main__':
+    description = 'Put the data for a range of dates in the db'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-s', '--start', dest='start', action='store',
+                        required=True, help='first date')
+    parser.add_argument('-e', '--end', dest='end', action='store',
+                        default='today', help='last date')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        action='store', default=None,
+                        help='max number of concurrent queries')
+    args = parser.parse_args()
+
+    models.backfill(args.start, end=args.end, workers=args.workers)
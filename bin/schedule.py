@@ -3,15 +3,9 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from apscheduler.schedulers.blocking import BlockingScheduler
-from spikes import models
+from spikes.schedule import Updater
 
 
 sched = BlockingScheduler()
-
-
-@sched.scheduled_job('interval', minutes=10)
-def timed_job():
-    models.update()
-
-
+Updater(sched).start()
 sched.start()
@@ -28,6 +28,13 @@ def signatures_rest():
     return api.signatures()
 
 
+@app.route('/metrics', methods=['GET'])
+@cross_origin()
+def metrics_rest():
+    from spikes import api
+    return api.metrics()
+
+
 @app.route('/')
 @app.route('/signatures.html')
 def signatures_html():
@@ -0,0 +1,245 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import json
+import time
+import aiohttp
+from libmozdata import config as mdconfig
+from libmozdata import socorro
+from libmozdata.bugzilla import Bugzilla
+from libmozdata.connection import Connection
+from . import config
+from . import datacollector as dc
+from .logger import logger
+from .metrics import get_nfacets, metrics
+
+
+def get_params(params):
+    """Get the params as a list of pairs (a list gives several pairs)
+
+    Args:
+        params (dict): the params
+
+    Returns:
+        list[tuple]: the pairs (key, value)
+    """
+    res = []
+    for k, v in params.items():
+        for x in v if isinstance(v, list) else [v]:
+            res.append((k, str(x)))
+    return res
+
+
+def send(plan, value):
+    """Send a value to a plan (StopIteration can't go through a future)
+
+    Args:
+        plan (generator): the plan
+        value: the value to send (None to start the plan)
+
+    Returns:
+        (bool, object): True and the value returned by the plan if it's
+                        done, False and its next step otherwise
+    """
+    try:
+        return False, plan.send(value)
+    except StopIteration as e:
+        return True, e.value
+
+
+class Session(object):
+    """A pooled HTTP session to query Socorro and Bugzilla with asyncio.
+
+    The datacollector plans are run with run_plan: all the searches of a
+    step are sent at once and the connection pool limits the number of
+    queries in flight. The plans are run in a thread between the steps
+    since they can read and write a cache in the db.
+    """
+
+    def __init__(self, workers=None, socorro_url=None, bugzilla_url=None,
+                 timeout=Connection.TIMEOUT, max_retries=5):
+        self.workers = workers or config.get_workers()
+        self.socorro_url = socorro_url or socorro.Socorro.API_URL
+        self.bugzilla_url = bugzilla_url or Bugzilla.API_URL
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = None
+        self.executor = None
+
+        user_agent = mdconfig.get('User-Agent', 'name', 'spikes')
+        self.headers = {'User-Agent': user_agent}
+        self.socorro_headers = {}
+        if socorro.Socorro.TOKEN:
+            self.socorro_headers['Auth-Token'] = socorro.Socorro.TOKEN
+        self.bugzilla_headers = {}
+        if Bugzilla.TOKEN:
+            self.bugzilla_headers['X-Bugzilla-API-Key'] = Bugzilla.TOKEN
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.workers)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             timeout=timeout,
+                                             headers=self.headers)
+        # a single thread: the steps of the plans don't run concurrently
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        return self
+
+    async def __aexit__(self, *args):
+        await self.session.close()
+        # a step of a cancelled plan may still be running
+        self.executor.shutdown(wait=False)
+
+    async def get_json(self, url, params, headers={}, name=''):
+        """Get the json from an url, retry with a backoff on server errors,
+        connection errors and timeouts
+
+        Args:
+            url (str): the url
+            params (dict): the params
+            headers (dict): the extra headers
+            name (str): the name of the query for the metrics
+
+        Returns:
+            dict: the json
+        """
+        params = get_params(params)
+        start = time.perf_counter()
+        for retry in range(self.max_retries + 1):
+            last = retry == self.max_retries
+            try:
+                async with self.session.get(url,
+                                            params=params,
+                                            headers=headers) as res:
+                    if res.status in Connection.STATUS_FORCELIST and \
+                       not last:
+                        await asyncio.sleep(0.5 * 2 ** retry)
+                        continue
+                    res.raise_for_status()
+                    body = await res.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if last:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** retry)
+                continue
+            data = json.loads(body)
+            metrics.add(name or url, time.perf_counter() - start,
+                        size=len(body), facets=get_nfacets(data),
+                        retries=retry)
+            return data
+
+    async def search(self, params, handler, handlerdata):
+        try:
+            data = await self.get_json(self.socorro_url + '/SuperSearch/',
+                                       params,
+                                       headers=self.socorro_headers,
+                                       name='socorro.SuperSearch')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not dc.is_failsafe(handler):
+                raise
+            logger.warning('SuperSearch query failed: {}.'.format(
+                dc.get_error_str(e)))
+            data = dc.get_error_response(e)
+        handler(data, handlerdata)
+
+    async def step(self, plan, value=None):
+        """Run a plan until its next step in the executor (see send)"""
+        loop = asyncio.get_running_loop()
+        # the app context (if any) is kept in the thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, ctx.run, send, plan,
+                                          value)
+
+    async def run_plan(self, plan):
+        """Run a datacollector plan
+
+        Args:
+            plan (generator): the plan
+
+        Returns:
+            the value returned by the plan
+        """
+        done, searches = await self.step(plan)
+        while not done:
+            await asyncio.gather(*[self.search(*s) for s in searches])
+            done, searches = await self.step(plan)
+        return searches
+
+
+async def get(session, *args, **kwargs):
+    """Same as datacollector.get"""
+    return await session.run_plan(dc.get.plan(*args, **kwargs))
+
+
+async def get_by_install_time(session, *args, **kwargs):
+    """Same as datacollector.get_by_install_time"""
+    plan = dc.get_by_install_time.plan(*args, **kwargs)
+    return await session.run_plan(plan)
+
+
+async def get_total(session, *args, **kwargs):
+    """Same as datacollector.get_total"""
+    return await session.run_plan(dc.get_total.plan(*args, **kwargs))
+
+
+async def get_signatures(session, *args, **kwargs):
+    """Same as datacollector.get_signatures"""
+    return await session.run_plan(dc.get_signatures.plan(*args, **kwargs))
+
+
+async def get_sgns_by_install_time(session, *args, **kwargs):
+    """Same as datacollector.get_sgns_by_install_time"""
+    plan = dc.get_sgns_by_install_time.plan(*args, **kwargs)
+    return await session.run_plan(plan)
+
+
+async def get_sgns_info(session, *args, **kwargs):
+    """Same as datacollector.get_sgns_info"""
+    return await session.run_plan(dc.get_sgns_info.plan(*args, **kwargs))
+
+
+async def query_bugs(session, kind, keys):
+    """Same as datacollector.query_bugs"""
+    res = {}
+
+    async def get_sgns_bugs(sgns):
+        data = await session.get_json(session.socorro_url + '/Bugs/',
+                                      {'signatures': sgns},
+                                      headers=session.socorro_headers,
+                                      name='socorro.Bugs')
+        for hit in data['hits']:
+            res.setdefault(hit['signature'], []).append(hit['id'])
+
+    async def get_statuses(bugs):
+        params = {'id': ','.join(str(b) for b in bugs),
+                  'include_fields': 'id,status'}
+        data = await session.get_json(session.bugzilla_url,
+                                      params,
+                                      headers=session.bugzilla_headers,
+                                      name='bugzilla')
+        for bug in data['bugs']:
+            res[bug['id']] = bug['status']
+
+    if kind == 'signatures':
+        chunks = Connection.chunks(keys, 10)
+        await asyncio.gather(*[get_sgns_bugs(sgns) for sgns in chunks])
+        # a bug can be in several hits of a signature
+        res = {s: sorted(set(bugs)) for s, bugs in res.items()}
+    else:
+        chunks = Connection.chunks(keys, Bugzilla.BUGZILLA_CHUNK_SIZE)
+        await asyncio.gather(*[get_statuses(bugs) for bugs in chunks])
+    return res
+
+
+async def get_bugs(session, signatures, cache=None):
+    """Same as datacollector.get_bugs"""
+    plan = dc.get_bugs_plan(signatures, cache=cache)
+    done, step = await session.step(plan)
+    while not done:
+        done, step = await session.step(plan,
+                                        await query_bugs(session, *step))
+    return step
@@ -4,6 +4,8 @@
 
 from flask import request, jsonify
 from spikes import models, utils
+from spikes.metrics import Run
+from spikes.webcache import cache
 
 
 def signatures():
@@ -16,5 +18,14 @@ def signatures():
     signature = request.args.get('signature', '')
     signature = utils.get_correct_sgn(signature)
 
-    return jsonify(models.Signatures.get(product, channel,
-                                         date, sgn=signature))
+    def make():
+        return jsonify(models.Signatures.get(product, channel,
+                                             date, sgn=signature))
+
+    return cache.get(('api', product, channel, date, signature), make)
+
+
+def metrics():
+    n = request.args.get('n', '10')
+    n = int(n) if n.isdigit() else 10
+    return jsonify({'runs': Run.get_last(n)})
@@ -0,0 +1,252 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import json
+import time
+from dateutil.relativedelta import relativedelta
+import numpy as np
+from . import datacollector as dc
+from . import differentiators as diftors
+from . import replay
+from . import tools
+
+
+DETECTORS = ['signatures', 'startup']
+COEFFS = [2., 2.5, 3., 3.5, 4.]
+WINS = [3, 5, 7, 9]
+ALPHAS = [0.01, 0.05]
+
+# the data of a worker process (see init_data and init_windows)
+__DATA = {}
+
+
+def init_data(path):
+    __DATA['data'] = replay.load(path)
+
+
+def init_windows(windows):
+    __DATA['windows'] = windows
+
+
+def get_windows(i, winmax=replay.NDAYS):
+    """Get the numbers (which don't depend on the settings) for the i-th
+    date of the data
+
+    Returns:
+        dict: detector => list of (product, channel, top signatures[,
+              installs])
+    """
+    data = __DATA['data']
+    date = data['dates'][i]
+    sgns = []
+    for product, buckets in data['signatures'].items():
+        windows = dc.get_windows(buckets, [date], product, ndays=winmax)[0]
+        sgns += [(product, chan, stats) for chan, stats in windows.items()]
+
+    startup = []
+    first = date - relativedelta(weeks=replay.INSTALLS_WEEKS)
+    for product, installs in data['installs'].items():
+        windows = dc.get_windows(data['startup'][product], [date], product,
+                                 ndays=replay.NDAYS_STARTUP)[0]
+        for chan, x in installs.items():
+            numbers = [n for d, n in sorted(x.items()) if first <= d <= date]
+            startup.append((product, chan, windows[chan], numbers))
+
+    return {'signatures': sgns, 'startup': startup}
+
+
+def get_signatures_alerts(coeffs, win, winmax, alpha):
+    """Same as signatures.get for some coeffs
+
+    Returns:
+        dict: coeff => list of the sets of alerts (product, channel,
+              signature) for each date
+    """
+    res = {coeff: [] for coeff in coeffs}
+    for windows in __DATA['windows']:
+        alerts = {coeff: set() for coeff in coeffs}
+        for product, chan, stats in windows['signatures']:
+            # the global stats don't depend on the coeff
+            globalstats = tools.get_global(stats, winmin=win, winmax=winmax,
+                                           alpha=alpha)
+            for coeff in coeffs:
+                wins, _ = tools.are_sgns_spiking(stats.matrix, globalstats,
+                                                 coeff, win, winmax)
+                alerts[coeff].update((product, chan, stats.signatures[i])
+                                     for i in np.flatnonzero(wins))
+        for coeff in coeffs:
+            res[coeff].append(alerts[coeff])
+
+    return res
+
+
+def get_startup_alerts(coeff, wins, alphas):
+    """Same as startup.get for some windows and alphas
+
+    Returns:
+        dict: (win, alpha) => list of the sets of alerts (product, channel,
+              signature) for each date
+    """
+    settings = [(win, alpha) for win in wins for alpha in alphas]
+    res = {s: [] for s in settings}
+    for windows in __DATA['windows']:
+        alerts = {s: set() for s in settings}
+        for product, chan, stats, numbers in windows['startup']:
+            # the moving means don't depend on the window
+            mx, md = tools.multimoving(numbers[:-1], coeff=coeff)
+            outliers = {}
+            for win, alpha in settings:
+                spike = tools.get_spike(numbers, mx, md, coeff=coeff,
+                                        win=win)
+                if spike != 'up':
+                    continue
+                if alpha not in outliers:
+                    outliers[alpha], _ = dc.get_outliers(stats,
+                                                         diff=diftors.diff,
+                                                         alpha=alpha)
+                alerts[(win, alpha)].update((product, chan, o)
+                                            for o in outliers[alpha])
+        for s in settings:
+            res[s].append(alerts[s])
+
+    return res
+
+
+def get_stats(alerts):
+    """Get the numbers of alerts by day and their stability
+
+    The stability is the mean of the Jaccard indices of the sets of alerts
+    of two consecutive days (1 when the alerts are the same every day).
+    """
+    counts = [len(a) for a in alerts]
+    jaccard = [len(a & b) / len(a | b) if a | b else 1.
+               for a, b in zip(alerts, alerts[1:])]
+    return {'alerts': counts,
+            'mean': float(np.mean(counts)),
+            'std': float(np.std(counts)),
+            'stability': float(np.mean(jaccard)) if jaccard else 1.}
+
+
+def run_task(task):
+    detector, coeffs, wins, alphas, winmax = task
+    if detector == 'signatures':
+        # a task by (win, alpha): the global stats are shared by the coeffs
+        win, alpha = wins[0], alphas[0]
+        alerts = get_signatures_alerts(coeffs, win, winmax, alpha)
+        alerts = {(coeff, win, alpha): a for coeff, a in alerts.items()}
+    else:
+        # a task by coeff: the moving means are shared by the windows
+        coeff = coeffs[0]
+        alerts = get_startup_alerts(coeff, wins, alphas)
+        alerts = {(coeff, win, alpha): a for (win, alpha), a in
+                  alerts.items()}
+    res = []
+    for (coeff, win, alpha), a in alerts.items():
+        r = {'detector': detector, 'coeff': coeff, 'win': win,
+             'alpha': alpha}
+        r.update(get_stats(a))
+        res.append(r)
+    return res
+
+
+def run(f, tasks, initializer, initarg, processes):
+    if processes == 1:
+        initializer(initarg)
+        return list(map(f, tasks))
+    with ProcessPoolExecutor(max_workers=processes, initializer=initializer,
+                             initargs=(initarg,)) as executor:
+        return list(executor.map(f, tasks))
+
+
+def backtest(path, detectors=DETECTORS, coeffs=COEFFS, wins=WINS,
+             alphas=ALPHAS, winmax=replay.NDAYS, processes=None):
+    """Replay the data dumped by spikes.replay for a grid of settings
+
+    The numbers of each date are computed once, then the settings are
+    grouped in tasks run in a process pool: a task by (win, alpha) for the
+    signatures (the global stats are shared by the coeffs) and a task by
+    coeff for the startup crashes (the moving means are shared by the
+    windows).
+
+    Args:
+        path (str): the data dumped by spikes.replay
+        detectors (list[str]): signatures and/or startup
+        coeffs (list[float]): the coefficients for the standard deviation
+        wins (list[int]): the windows (winmin for the signatures)
+        alphas (list[float]): the significance levels of the ESD tests
+        winmax (int): the max window for the signatures
+        processes (int): the number of processes (None for the number of
+                         cpus)
+
+    Returns:
+        dict: the dates and the results for each setting
+    """
+    with np.load(path) as arrays:
+        dates = arrays['dates'].tolist()
+        ndays = int(arrays['ndays'])
+    if winmax > ndays:
+        raise ValueError('The data only have {} days before a '
+                         'date'.format(ndays))
+    if 'signatures' in detectors and max(wins) > winmax:
+        raise ValueError('The windows must be at most {}'.format(winmax))
+
+    windows = run(functools.partial(get_windows, winmax=winmax),
+                  range(len(dates)), init_data, path, processes)
+    tasks = []
+    if 'signatures' in detectors:
+        tasks += [('signatures', coeffs, [win], [alpha], winmax)
+                  for win in wins for alpha in alphas]
+    if 'startup' in detectors:
+        tasks += [('startup', [coeff], wins, alphas, winmax)
+                  for coeff in coeffs]
+    results = run(run_task, tasks, init_windows, windows, processes)
+
+    return {'dates': dates,
+            'results': [r for res in results for r in res]}
+
+
+if __name__ == '__main__':
+    description = 'Backtest the spike detectors on dumped data'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('file', help='npz file (see spikes.replay)')
+    parser.add_argument('-d', '--detectors', dest='detectors', nargs='+',
+                        choices=DETECTORS, default=DETECTORS,
+                        help='detectors')
+    parser.add_argument('-c', '--coeffs', dest='coeffs', type=float,
+                        nargs='+', action='store', default=COEFFS,
+                        help='coefficients')
+    parser.add_argument('-w', '--wins', dest='wins', type=int, nargs='+',
+                        action='store', default=WINS, help='windows')
+    parser.add_argument('-a', '--alphas', dest='alphas', type=float,
+                        nargs='+', action='store', default=ALPHAS,
+                        help='significance levels of the ESD tests')
+    parser.add_argument('--winmax', dest='winmax', type=int,
+                        action='store', default=replay.NDAYS,
+                        help='max window for the signatures')
+    parser.add_argument('-p', '--processes', dest='processes', type=int,
+                        action='store', default=None,
+                        help='number of processes')
+    parser.add_argument('-o', '--output', dest='output', action='store',
+                        default='', help='JSON file for the results')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    res = backtest(args.file, detectors=args.detectors, coeffs=args.coeffs,
+                   wins=args.wins, alphas=args.alphas, winmax=args.winmax,
+                   processes=args.processes)
+    for r in res['results']:
+        print('{}: coeff: {}, win: {}, alpha: {}, alerts by day: {:.1f} '
+              '(std {:.1f}), stability: {:.2f}'.format(r['detector'],
+                                                       r['coeff'], r['win'],
+                                                       r['alpha'], r['mean'],
+                                                       r['std'],
+                                                       r['stability']))
+    print('{} settings over {} dates in {:.2f}s'.format(
+        len(res['results']), len(res['dates']), time.perf_counter() - start))
+    if args.output:
+        with open(args.output, 'w') as Out:
+            json.dump(res, Out, indent=2)
@@ -0,0 +1,115 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import datetime
+from libmozdata.connection import Connection
+from sqlalchemy import select
+from spikes import db
+from . import config
+from .cache import CHUNK_SIZE, get_engine
+from .logger import logger
+
+
+class SignatureBugs(db.Model):
+    __tablename__ = 'signature_bugs'
+
+    signature = db.Column(db.String(512), primary_key=True)
+    bugs = db.Column(db.JSON)
+    expires = db.Column(db.DateTime)
+
+
+class BugStatus(db.Model):
+    __tablename__ = 'bug_status'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(32))
+    expires = db.Column(db.DateTime)
+
+
+class BugsCache(object):
+    """Cache for the bugs of the signatures and for the bug statuses.
+
+    The entries are stored in the db with an expiry date (ttl seconds after
+    they have been fetched), so only the missing or expired signatures and
+    bugs are queried.
+    """
+
+    def __init__(self, ttl=None, engine=None):
+        if ttl is None:
+            ttl = config.get_bugs_ttl()
+        self.ttl = ttl
+        self.engine = engine if engine is not None else get_engine()
+        # kind => [number of queried keys, number of hits]
+        self.stats = {'signatures': [0, 0], 'bugs': [0, 0]}
+        for table in [SignatureBugs.__table__, BugStatus.__table__]:
+            table.create(self.engine, checkfirst=True)
+
+    def __get(self, kind, column, value, keys):
+        now = datetime.datetime.utcnow()
+        table = column.table
+        res = {}
+        with self.engine.connect() as conn:
+            for chunk in Connection.chunks(list(keys), CHUNK_SIZE):
+                q = select(column, value).where(column.in_(chunk),
+                                                table.c.expires > now)
+                for k, v in conn.execute(q):
+                    res[k] = v
+        stats = self.stats[kind]
+        stats[0] += len(keys)
+        stats[1] += len(res)
+        return res
+
+    def __put(self, column, value, data):
+        now = datetime.datetime.utcnow()
+        expires = now + datetime.timedelta(seconds=self.ttl)
+        table = column.table
+        with self.engine.begin() as conn:
+            # the expired entries which are not queried anymore
+            conn.execute(table.delete().where(table.c.expires < now))
+            for chunk in Connection.chunks(list(data.keys()), CHUNK_SIZE):
+                conn.execute(table.delete().where(column.in_(chunk)))
+                rows = [{column.name: k,
+                         value.name: data[k],
+                         'expires': expires} for k in chunk]
+                conn.execute(table.insert(), rows)
+
+    def get_bugs(self, signatures):
+        """Get the cached bugs of the signatures
+
+        Args:
+            signatures (list[str]): the signatures
+
+        Returns:
+            dict: signature => list of bug ids (for the cached ones)
+        """
+        t = SignatureBugs.__table__
+        return self.__get('signatures', t.c.signature, t.c.bugs, signatures)
+
+    def put_bugs(self, bugs_by_signature):
+        t = SignatureBugs.__table__
+        self.__put(t.c.signature, t.c.bugs, bugs_by_signature)
+
+    def get_statuses(self, bugs):
+        """Get the cached statuses of the bugs
+
+        Args:
+            bugs (list[int]): the bug ids
+
+        Returns:
+            dict: bug id => status (None for an inaccessible bug)
+        """
+        t = BugStatus.__table__
+        return self.__get('bugs', t.c.id, t.c.status, bugs)
+
+    def put_statuses(self, statuses):
+        t = BugStatus.__table__
+        self.__put(t.c.id, t.c.status, statuses)
+
+    def log(self):
+        msg = []
+        for kind in ['signatures', 'bugs']:
+            n, hits = self.stats[kind]
+            rate = float(hits) / float(n) if n else 0.
+            msg.append('{}/{} {} ({:.0%})'.format(hits, n, kind, rate))
+        logger.info('Bugs cache hits: {}.'.format(', '.join(msg)))
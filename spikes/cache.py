@@ -0,0 +1,197 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import datetime
+import hashlib
+import json
+from dateutil.relativedelta import relativedelta
+from flask import has_app_context
+from libmozdata import utils
+from libmozdata.connection import Connection
+from sqlalchemy import select
+from spikes import db
+from . import config
+
+
+CHUNK_SIZE = 500
+
+
+def get_pc(product, channel):
+    return product[:2] + channel[0].upper()
+
+
+def _get_date(d):
+    # libmozdata gives some datetimes but the db only stores dates
+    return d.date() if isinstance(d, datetime.datetime) else d
+
+
+class Buckets(db.Model):
+    __tablename__ = 'buckets'
+    __table_args__ = (db.Index('ix_buckets_pc_key_date',
+                               'pc', 'key', 'date', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    pc = db.Column(db.String(3))
+    key = db.Column(db.String(40))
+    date = db.Column(db.Date)
+    fetched = db.Column(db.Date)
+    counts = db.Column(db.JSON)
+
+    def __init__(self, pc, key, date, fetched, counts):
+        self.pc = pc
+        self.key = key
+        self.date = date
+        self.fetched = fetched
+        self.counts = counts
+
+    def __repr__(self):
+        s = '<Bucket id: {}, pc: {}, key: {}, date: {}, fetched: {}>'
+        return s.format(self.id, self.pc, self.key, self.date, self.fetched)
+
+
+def get_engine():
+    """Get the engine of the db (the default one of the caches)"""
+    if not has_app_context():
+        raise RuntimeError('The caches need an app context to use the db '
+                           '(or an explicit engine).')
+    return db.engine
+
+
+class CountsCache(object):
+    """Cache for the numbers of crashes by signature for a day.
+
+    A day is cached by (product, channel, key, day) where the key identifies
+    the query which has been used to get the numbers. The numbers for a day
+    can still change for a few days (crashes are submitted late), so a bucket
+    is only used when it has been fetched after this mutability window.
+    """
+
+    def __init__(self, mutable_days=None):
+        if mutable_days is None:
+            mutable_days = config.get_mutable_days()
+        self.mutable_days = mutable_days
+        self.buckets = {}
+
+    @staticmethod
+    def get_key(params):
+        """Get a key for the query params (the date is not used)
+
+        Args:
+            params (dict): the SuperSearch params
+
+        Returns:
+            str: the key
+        """
+        params = {k: v for k, v in params.items() if k != 'date'}
+        params = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha1(params.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def today():
+        return utils.get_date_ymd('today').date()
+
+    def is_final(self, day, fetched):
+        return fetched >= day + relativedelta(days=self.mutable_days)
+
+    def get(self, product, channel, key, days):
+        """Get the final buckets for some days
+
+        Args:
+            product (str): the product
+            channel (str): the channel
+            key (str): the query key
+            days (list[datetime]): the days
+
+        Returns:
+            dict: day => {signature => count}
+        """
+        res = {}
+        pc = get_pc(product, channel)
+        for day in days:
+            b = self.buckets.get((pc, key, _get_date(day)))
+            if b is not None:
+                fetched, counts = b
+                if self.is_final(_get_date(day), fetched):
+                    res[day] = counts
+        return res
+
+    def put(self, product, channel, key, buckets):
+        """Put some buckets fetched today in the cache
+
+        Args:
+            product (str): the product
+            channel (str): the channel
+            key (str): the query key
+            buckets (dict): day => {signature => count}
+        """
+        pc = get_pc(product, channel)
+        today = CountsCache.today()
+        for day, counts in buckets.items():
+            self.buckets[(pc, key, _get_date(day))] = (today, counts)
+
+    def prune(self, date, ndays):
+        """Remove the buckets of the days more than ndays before date
+
+        Args:
+            date (datetime): the last day
+            ndays (int): the number of days to keep before date
+
+        Returns:
+            int: the number of removed buckets
+        """
+        first = _get_date(date) - relativedelta(days=ndays)
+        old = [k for k in self.buckets if k[2] < first]
+        for k in old:
+            del self.buckets[k]
+        return len(old)
+
+
+class DBCountsCache(CountsCache):
+    """Counts cache stored in the database."""
+
+    def __init__(self, mutable_days=None, engine=None):
+        super(DBCountsCache, self).__init__(mutable_days=mutable_days)
+        self.engine = engine if engine is not None else get_engine()
+        Buckets.__table__.create(self.engine, checkfirst=True)
+
+    def get(self, product, channel, key, days):
+        if not days:
+            return {}
+        pc = get_pc(product, channel)
+        dates = {_get_date(day): day for day in days}
+        t = Buckets.__table__
+        res = {}
+        with self.engine.connect() as conn:
+            for chunk in Connection.chunks(list(dates), CHUNK_SIZE):
+                q = select(t.c.date, t.c.fetched, t.c.counts).where(
+                    t.c.pc == pc, t.c.key == key, t.c.date.in_(chunk))
+                for date, fetched, counts in conn.execute(q):
+                    if self.is_final(date, fetched):
+                        res[dates[date]] = counts
+        return res
+
+    def put(self, product, channel, key, buckets):
+        if not buckets:
+            return
+        pc = get_pc(product, channel)
+        today = CountsCache.today()
+        dates = {_get_date(day): counts for day, counts in buckets.items()}
+        t = Buckets.__table__
+        with self.engine.begin() as conn:
+            for chunk in Connection.chunks(list(dates), CHUNK_SIZE):
+                conn.execute(t.delete().where(t.c.pc == pc,
+                                              t.c.key == key,
+                                              t.c.date.in_(chunk)))
+                rows = [{'pc': pc,
+                         'key': key,
+                         'date': date,
+                         'fetched': today,
+                         'counts': dates[date]} for date in chunk]
+                conn.execute(t.insert(), rows)
+
+    def prune(self, date, ndays):
+        first = _get_date(date) - relativedelta(days=ndays)
+        t = Buckets.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(t.delete().where(t.c.date < first)).rowcount
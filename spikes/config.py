@@ -7,6 +7,7 @@ import re
 
 
 __SKIPLIST = None
+__SKIPPERS = {}
 __THRESHOLDS = None
 __GLOBAL = None
 
@@ -39,6 +40,64 @@ def get_skiplist_channel(chan):
     return sl.get(chan, []) + sl['common']
 
 
+class Skipper(object):
+    """Tell if a signature is in a skiplist.
+
+    The patterns are compiled in a single alternation (when it's possible)
+    and the verdicts are memoized by signature.
+    """
+
+    MAX_VERDICTS = 200000
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.regex = Skipper.get_regex(patterns)
+        self.verdicts = {}
+
+    @staticmethod
+    def get_regex(patterns):
+        if not patterns:
+            return None
+        for p in patterns:
+            # a backreference could refer to a group of another pattern
+            if p.flags != re.UNICODE or re.search(r'\\[1-9]|\(\?P=',
+                                                  p.pattern):
+                return None
+        pattern = '|'.join('(?:{})'.format(p.pattern) for p in patterns)
+        try:
+            return re.compile(pattern)
+        except re.error:
+            return None
+
+    def __call__(self, sgn):
+        verdict = self.verdicts.get(sgn)
+        if verdict is None:
+            if self.regex is not None:
+                verdict = self.regex.match(sgn) is not None
+            else:
+                verdict = any(p.match(sgn) for p in self.patterns)
+            if len(self.verdicts) >= Skipper.MAX_VERDICTS:
+                self.verdicts.clear()
+            self.verdicts[sgn] = verdict
+        return verdict
+
+
+def get_skipper(chan):
+    """Get the skipper for a channel (the same one for the whole run)
+
+    Args:
+        chan (str): the channel
+
+    Returns:
+        Skipper: skipper(sgn) is True when sgn must be skipped
+    """
+    skipper = __SKIPPERS.get(chan)
+    if skipper is None:
+        skipper = Skipper(get_skiplist_channel(chan))
+        __SKIPPERS[chan] = skipper
+    return skipper
+
+
 def get_thresholds():
     global __THRESHOLDS
     if not __THRESHOLDS:
@@ -69,3 +128,35 @@ def get_smtp_server():
 
 def get_sender():
     return get_global()['sender']
+
+
+def get_workers():
+    return get_global().get('workers', 8)
+
+
+def get_mutable_days():
+    return get_global().get('mutable_days', 2)
+
+
+def get_bugs_ttl():
+    return get_global().get('bugs_ttl', 3600)
+
+
+def get_max_runs():
+    return get_global().get('max_runs', 1000)
+
+
+def get_startup_deadline():
+    return get_global().get('startup_deadline', 600)
+
+
+def get_update_interval():
+    return get_global().get('update_interval', 600)
+
+
+def get_max_update_interval():
+    return get_global().get('max_update_interval', 3600)
+
+
+def get_max_url_length():
+    return get_global().get('max_url_length', 4096)
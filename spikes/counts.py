@@ -0,0 +1,168 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import numpy as np
+
+
+class Counts(object):
+    """Numbers of crashes by signature and by day.
+
+    The numbers are stored in an int32 matrix with a row for each signature
+    and a column for each day (in chronological order).
+    For reading, it behaves like a dict signature => list of numbers.
+    The signatures which have been merged in a new one are in members.
+    """
+
+    def __init__(self, days, capacity=256):
+        self.days = list(days)
+        self.day_index = {d: i for i, d in enumerate(self.days)}
+        self.index = {}
+        self.signatures = []
+        self.members = {}
+        self.data = np.zeros((capacity, len(self.days)), dtype=np.int32)
+
+    @staticmethod
+    def from_rows(days, signatures, matrix, members=None):
+        """Make a Counts from a matrix
+
+        Args:
+            days (list): the days
+            signatures (list[str]): the signatures (one for each row)
+            matrix (numpy.ndarray): the numbers
+            members (dict): merged signature => list of signatures
+
+        Returns:
+            Counts: the counts
+        """
+        c = Counts(days, capacity=0)
+        c.signatures = list(signatures)
+        c.index = {s: i for i, s in enumerate(c.signatures)}
+        c.data = np.asarray(matrix, dtype=np.int32).reshape(len(c.signatures),
+                                                            len(c.days))
+        if members:
+            c.members = {s: m for s, m in members.items() if s in c.index}
+        return c
+
+    @property
+    def matrix(self):
+        """The numbers: a row by signature and a column by day"""
+        return self.data[:len(self.signatures)]
+
+    def get_row(self, sgn):
+        """Get the row of the signature (a new one is created if needed)"""
+        i = self.index.get(sgn)
+        if i is None:
+            i = len(self.signatures)
+            if i == self.data.shape[0]:
+                grown = np.zeros((max(2 * i, 256), len(self.days)),
+                                 dtype=np.int32)
+                grown[:i] = self.data
+                self.data = grown
+            self.index[sgn] = i
+            self.signatures.append(sgn)
+        return i
+
+    def set(self, sgn, day, count):
+        # get_row must be called before accessing data (it can grow)
+        i = self.get_row(sgn)
+        self.data[i, self.day_index[day]] = count
+
+    def add(self, sgn, day, count):
+        i = self.get_row(sgn)
+        self.data[i, self.day_index[day]] += count
+
+    def set_day(self, day, counts, skip=None):
+        """Set the numbers of a day
+
+        Args:
+            day: the day
+            counts (dict): signature => count
+            skip (func): the signatures for which skip(sgn) is True are
+                         not set
+        """
+        j = self.day_index[day]
+        for sgn, count in counts.items():
+            if skip is None or not skip(sgn):
+                i = self.get_row(sgn)
+                self.data[i, j] = count
+
+    def merge(self, groups):
+        """Merge some signatures: the rows of a group are summed in a new row
+
+        The new rows are put after the rows of the remaining signatures.
+
+        Args:
+            groups (dict): new signature => list of signatures
+        """
+        if not groups:
+            return
+        # the row of each signature after the merge
+        target = np.full(len(self.signatures), -1, dtype=np.int64)
+        rows = [self.index[s] for sgns in groups.values() for s in sgns]
+        sizes = [len(sgns) for sgns in groups.values()]
+        target[rows] = np.repeat(np.arange(len(groups)), sizes)
+        merged = target != -1
+        keep = np.flatnonzero(~merged)
+        target[merged] += len(keep)
+        target[keep] = np.arange(len(keep))
+
+        # the rows with the same target are summed (each target has at
+        # least one row)
+        order = np.argsort(target, kind='stable')
+        starts = np.flatnonzero(np.diff(target[order], prepend=-1))
+        data = np.add.reduceat(self.matrix[order].astype(np.int64),
+                               starts, axis=0)
+
+        signatures = [self.signatures[i] for i in keep] + list(groups.keys())
+        self.signatures = signatures
+        self.index = {s: i for i, s in enumerate(signatures)}
+        self.members.update((s, list(sgns)) for s, sgns in groups.items())
+        self.data = data.astype(np.int32)
+
+    def take(self, rows):
+        """Get a new Counts with the given rows (in this order)
+
+        Args:
+            rows (list[int]): the rows
+
+        Returns:
+            Counts: the counts
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        signatures = [self.signatures[i] for i in rows]
+        return Counts.from_rows(self.days, signatures, self.matrix[rows],
+                                members=self.members)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, sgn):
+        return sgn in self.index
+
+    def __iter__(self):
+        return iter(self.signatures)
+
+    def __getitem__(self, sgn):
+        return self.data[self.index[sgn]].tolist()
+
+    def __eq__(self, other):
+        if isinstance(other, Counts):
+            return self.days == other.days and \
+                self.signatures == other.signatures and \
+                self.members == other.members and \
+                np.array_equal(self.matrix, other.matrix)
+        return NotImplemented
+
+    def __repr__(self):
+        return '<Counts: {} signatures, {} days>'.format(len(self),
+                                                         len(self.days))
+
+    def keys(self):
+        return list(self.signatures)
+
+    def values(self):
+        return self.matrix.tolist()
+
+    def items(self):
+        return list(zip(self.signatures, self.matrix.tolist()))
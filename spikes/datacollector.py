@@ -3,23 +3,232 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import copy
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dateutil.relativedelta import relativedelta
 import functools
+import json
+import time
+from urllib.parse import urlencode
 from libmozdata import socorro, utils
 from libmozdata.bugzilla import Bugzilla
-from libmozdata.connection import Connection
+from libmozdata.connection import Connection, Query
 import numpy as np
+from requests.exceptions import RequestException
 from . import differentiators as diftors
 from . import config, tools
+from .counts import Counts
 from .logger import logger
 from .gather import gather
+from .metrics import get_nfacets, metered, metrics
 
 
+# the number of weeks of the histograms of the installs
+INSTALLS_WEEKS = 25
+
+
+def failsafe(handler):
+    """Make a handler which is called with an error response (see
+    get_error_response) when its query failed instead of raising an
+    exception
+
+    Args:
+        handler (func): the handler
+
+    Returns:
+        func: the failsafe handler
+    """
+    handler = functools.partial(handler)
+    handler.failsafe = True
+    return handler
+
+
+def is_failsafe(handler):
+    return getattr(handler, 'failsafe', False)
+
+
+def get_error_str(error):
+    """Get a short description of the error of a query (without the url)"""
+    # requests and aiohttp errors
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', getattr(error, 'status', None))
+    if status is not None:
+        return 'HTTP error {}'.format(status)
+    return type(error).__name__
+
+
+def get_error_response(error):
+    """Get a SuperSearch response for a failed query"""
+    return {'errors': [get_error_str(error)],
+            'facets': {},
+            'hits': [],
+            'total': 0}
+
+
+def run_searches(searches, workers=None):
+    """Run some SuperSearch queries with at most workers queries in flight
+
+    Args:
+        searches (list): list of (params, handler, handlerdata)
+        workers (int): the max number of concurrent queries
+
+    Returns:
+        None
+    """
+    workers = workers or config.get_workers()
+
+    def run(search):
+        params, handler, handlerdata = search
+        facets = []
+
+        def hdler(json, *args):
+            facets.append(get_nfacets(json))
+            handler(json, *args)
+
+        start = time.perf_counter()
+        try:
+            SuperSearch = metered(socorro.SuperSearch, 'socorro.SuperSearch')
+            SuperSearch(params=params,
+                        handler=hdler,
+                        handlerdata=handlerdata).wait()
+        except RequestException as e:
+            if not is_failsafe(handler):
+                raise
+            logger.warning('SuperSearch query failed: {}.'.format(
+                get_error_str(e)))
+            handler(get_error_response(e), handlerdata)
+        metrics.add('socorro.SuperSearch', time.perf_counter() - start,
+                    facets=sum(facets))
+
+    if workers == 1 or len(searches) <= 1:
+        for search in searches:
+            run(search)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for f in [executor.submit(run, s) for s in searches]:
+            f.result()
+
+
+def run_plan(plan, workers=None):
+    """Run a plan: the searches yielded by the plan are run with run_searches
+
+    Args:
+        plan (generator): the plan
+        workers (int): the max number of concurrent queries
+
+    Returns:
+        the value returned by the plan
+    """
+    try:
+        searches = next(plan)
+        while True:
+            run_searches(searches, workers=workers)
+            searches = next(plan)
+    except StopIteration as e:
+        return e.value
+
+
+def get_search_key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def dedupe_searches(searches):
+    """Send the exact duplicate searches (byte-identical params) only once
+
+    The response of such a search is dispatched to all its handlers. Nothing
+    else is merged: the searches which only differ by their _facets or
+    _histogram params are all sent (the plans don't make such searches).
+
+    Args:
+        searches (list): list of (params, handler, handlerdata)
+
+    Returns:
+        list: the searches without the duplicates
+    """
+    groups = OrderedDict()
+    for params, handler, handlerdata in searches:
+        _, handlers = groups.setdefault(get_search_key(params), (params, []))
+        handlers.append((handler, handlerdata))
+
+    def dispatch(json, handlers):
+        for handler, handlerdata in handlers:
+            handler(json, handlerdata)
+
+    res = []
+    for params, handlers in groups.values():
+        if len(handlers) == 1:
+            res.append((params,) + handlers[0])
+        elif all(is_failsafe(h) for h, _ in handlers):
+            res.append((params, failsafe(dispatch), handlers))
+        else:
+            res.append((params, dispatch, handlers))
+    return res
+
+
+def batch(*plans):
+    """Batch the rounds of some plans into one plan
+
+    The searches of the current steps of all the plans are sent in the same
+    round, so independent plans need as many rounds as the longest one
+    instead of the sum of their rounds. The number of searches is only
+    reduced by the exact duplicates (see dedupe_searches).
+
+    Args:
+        plans (generator): the plans
+
+    Returns:
+        tuple: the values returned by the plans
+    """
+    res = [None] * len(plans)
+    steps = {}
+
+    def step(i):
+        try:
+            steps[i] = next(plans[i])
+        except StopIteration as e:
+            steps.pop(i, None)
+            res[i] = e.value
+
+    for i in range(len(plans)):
+        step(i)
+    while steps:
+        yield dedupe_searches([s for i in sorted(steps) for s in steps[i]])
+        for i in sorted(steps):
+            step(i)
+
+    return tuple(res)
+
+
+def collector(plan):
+    """Make a collector from a plan
+
+    A plan is a generator which yields lists of searches
+    (params, handler, handlerdata) and which returns the collected data once
+    the searches have been run. The collector runs the plan with run_plan
+    and takes an extra workers argument. The plan itself is available in the
+    plan attribute of the collector (e.g. for the asyncio collector).
+
+    Args:
+        plan (function): the function returning the plan
+
+    Returns:
+        function: the collector
+    """
+    @functools.wraps(plan)
+    def wrapper(*args, **kwargs):
+        workers = kwargs.pop('workers', None)
+        return run_plan(plan(*args, **kwargs), workers=workers)
+
+    wrapper.plan = plan
+    return wrapper
+
+
+@collector
 def get(channels, product='Firefox', date='today', query={}):
     today = utils.get_date_ymd(date)
     tomorrow = today + relativedelta(days=1)
-    six_months_ago = today - relativedelta(weeks=25)
+    six_months_ago = today - relativedelta(weeks=INSTALLS_WEEKS)
     search_date = socorro.SuperSearch.get_search_date(six_months_ago, tomorrow)
     data = {chan: {} for chan in channels}
 
@@ -42,54 +251,110 @@ def get(channels, product='Firefox', date='today', query={}):
               '_results_number': 0}
     params.update(query)
 
-    socorro.SuperSearch(params=params,
-                        handler=handler,
-                        handlerdata=data).wait()
+    yield [(params, handler, data)]
 
     return data
 
 
+@collector
 def get_by_install_time(channels, product='Firefox',
-                        date='today', query={}):
+                        date='today', query={}, weeks=INSTALLS_WEEKS,
+                        cache=None):
+    """Get the number of installs with a crash by day
+
+    With a cache, the final days are taken from the cache and only the days
+    from the first missing one (generally the last mutable days) are queried.
+
+    Args:
+        channels (list[str]): the channels
+        product (str): the product
+        date (str): the last day
+        query (dict): extra query parameters
+        weeks (int): the number of weeks before the last day
+        cache (CountsCache): the cache for the days
+
+    Returns:
+        dict: channel => day => number of installs
+    """
     today = utils.get_date_ymd(date)
     tomorrow = today + relativedelta(days=1)
-    six_months_ago = today - relativedelta(weeks=25)
-    search_date = socorro.SuperSearch.get_search_date(six_months_ago, tomorrow)
+    six_months_ago = today - relativedelta(weeks=weeks)
+    days = [six_months_ago + relativedelta(days=i)
+            for i in range((today - six_months_ago).days + 1)]
     data = {chan: {} for chan in channels}
+    # day => number of installs (None when there's no crash), a bucket is
+    # only set when the query succeeded
+    buckets = {chan: {} for chan in channels}
 
     def handler(json, data):
-        if not json['facets']['histogram_date']:
+        if json.get('errors'):
             return
 
+        res = {}
         for facets in json['facets']['histogram_date']:
             date = utils.get_date_ymd(facets['term'])
             ninstalls = facets['facets']['cardinality_install_time']['value']
-            data[date] = ninstalls
+            res[date] = ninstalls
+        for day in data['days']:
+            data['numbers'][day] = res.get(day)
 
     params = {'product': product,
-              'date': search_date,
+              'date': '',
               'release_channel': '',
               '_histogram.date': '_cardinality.install_time',
               '_results_number': 10}
     params.update(query)
 
     searches = []
+    cached = {}
     for chan in channels:
         params = copy.deepcopy(params)
         params['release_channel'] = chan
-        searches.append(socorro.SuperSearch(params=params,
-                                            handler=handler,
-                                            handlerdata=data[chan]))
+        old = {}
+        if cache is not None:
+            key = cache.get_key(params)
+            with metrics.timer('cache.get'):
+                old = cache.get(product, chan, key, days)
+        # the days from the first missing one are queried
+        first = next((i for i, day in enumerate(days) if day not in old),
+                     len(days))
+        for day in days[:first]:
+            buckets[chan][day] = old[day]
+        if first < len(days):
+            params = copy.deepcopy(params)
+            params['date'] = socorro.SuperSearch.get_search_date(days[first],
+                                                                 tomorrow)
+            handlerdata = {'days': days[first:], 'numbers': buckets[chan]}
+            searches.append((params, handler, handlerdata))
+            if cache is not None:
+                cached[chan] = (key, days[first:])
+
+    if cache is not None:
+        ndays = sum(len(d) for _, d in cached.values())
+        logger.info('Get installs for {}: {} queries ({} new days).'.format(
+            product, len(searches), ndays))
+
+    yield searches
 
-    for s in searches:
-        s.wait()
+    for chan in channels:
+        if chan in cached:
+            key, queried = cached[chan]
+            new = {day: buckets[chan][day] for day in queried
+                   if day in buckets[chan]}
+            with metrics.timer('cache.put'):
+                cache.put(product, chan, key, new)
+        for day in days:
+            n = buckets[chan].get(day)
+            if n is not None:
+                data[chan][day] = n
 
     return data
 
 
 def get_versions(channels, date, product='Firefox'):
     res = defaultdict(lambda: list())
-    versions = socorro.ProductVersions.get_all_versions(product)
+    with metrics.timer('socorro.ProductVersions'):
+        versions = socorro.ProductVersions.get_all_versions(product)
     date = utils.get_date_ymd(date)
     for chan in channels:
         infos = sorted(versions[chan].values(),
@@ -103,6 +368,7 @@ def get_versions(channels, date, product='Firefox'):
     return res
 
 
+@collector
 def get_total(channels, product='Firefox', date='today'):
     today = utils.get_date_ymd(date)
     tomorrow = today + relativedelta(days=1)
@@ -120,49 +386,52 @@ def get_total(channels, product='Firefox', date='today'):
                 channel = chan['term']
                 data[channel] = total
 
-    socorro.SuperSearch(params={'product': product,
-                                'date': search_date,
-                                'release_channel': channels,
-                                '_histogram.date': 'release_channel',
-                                '_results_number': 0},
-                        handler=handler,
-                        handlerdata=data).wait()
+    params = {'product': product,
+              'date': search_date,
+              'release_channel': channels,
+              '_histogram.date': 'release_channel',
+              '_results_number': 0}
+
+    yield [(params, handler, data)]
 
     return data
 
 
 def get_top_signatures(data, product, chan, N=50):
     threshold = config.get_threshold(product, chan)
-    res = {}
-    for sgn, stats in data.items():
-        # replace dictionary with an array of numbers
-        numbers = tools.get_array(stats)
-        if numbers[-1] >= threshold:
-            res[sgn] = numbers
+    last = data.matrix[:, -1]
+    rows = np.flatnonzero(last >= threshold)
 
     if N:
         # take only the top N signatures for the last day
-        d = list(sorted(res.items(),
-                        key=lambda p: p[1][-1],
-                        reverse=True))
-        if len(d) > N:
-            res = dict(d[:N])
-        else:
-            res = dict(d)
-
-    return res
-
-
+        values = last[rows]
+        if len(rows) > N:
+            # partial selection: the values greater than the N-th greatest
+            # one and the first rows with a value equal to it
+            kth = np.partition(values, len(values) - N)[len(values) - N]
+            greater = values > kth
+            equal = np.flatnonzero(values == kth)
+            greater[equal[:N - np.count_nonzero(greater)]] = True
+            rows = rows[greater]
+            values = values[greater]
+        # the ties are sorted by row
+        order = np.argsort(-values, kind='stable')
+        rows = rows[order]
+
+    return data.take(rows)
+
+
+@collector
 def get_signatures(channels, product='Firefox',
                    date='today', query={}, ndays=7, N=50):
     today = utils.get_date_ymd(date)
     tomorrow = today + relativedelta(days=1)
     few_days_ago = today - relativedelta(days=ndays)
     search_date = socorro.SuperSearch.get_search_date(few_days_ago, tomorrow)
-    base = {few_days_ago + relativedelta(days=i): 0 for i in range(ndays + 1)}
-    data = {chan: defaultdict(lambda: copy.copy(base)) for chan in channels}
+    days = [few_days_ago + relativedelta(days=i) for i in range(ndays + 1)]
+    data = {chan: Counts(days) for chan in channels}
 
-    def handler(skip_pats, json, data):
+    def handler(skip, json, data):
         if json['errors'] or not json['facets']['histogram_date']:
             return
 
@@ -170,11 +439,11 @@ def get_signatures(channels, product='Firefox',
             date = utils.get_date_ymd(facets['term'])
             signatures = facets['facets']['signature']
             for signature in signatures:
-                if any(p.match(signature) for p in skip_pats):
+                sgn = signature['term']
+                if skip(sgn):
                     continue
                 total = signature['count']
-                sgn = signature['term']
-                data[sgn][date] += total
+                data.add(sgn, date, total)
 
     params = {'product': product,
               'date': search_date,
@@ -186,16 +455,13 @@ def get_signatures(channels, product='Firefox',
 
     searches = []
     for chan in channels:
-        skip_pats = config.get_skiplist_channel(chan)
+        skip = config.get_skipper(chan)
         params = copy.deepcopy(params)
         params['release_channel'] = chan
-        hdler = functools.partial(handler, skip_pats)
-        searches.append(socorro.SuperSearch(params=params,
-                                            handler=hdler,
-                                            handlerdata=data[chan]))
+        hdler = functools.partial(handler, skip)
+        searches.append((params, hdler, data[chan]))
 
-    for s in searches:
-        s.wait()
+    yield searches
 
     for chan in channels:
         gather(data[chan])
@@ -203,28 +469,89 @@ def get_signatures(channels, product='Firefox',
     return get_top_signatures(data, product, N=N)
 
 
+@collector
 def get_sgns_by_install_time(channels, product='Firefox',
                              date='today', query={},
-                             ndays=7, version=False, N=50):
-    logger.info('Get crashes numbers for {}: started.'.format(product))
-    limit = config.get_limit()
+                             ndays=7, version=False, N=50, cache=None):
     today = utils.get_date_ymd(date)
-    few_days_ago = today - relativedelta(days=ndays)
-    base = {few_days_ago + relativedelta(days=i): 0 for i in range(ndays + 1)}
-    data = {chan: defaultdict(lambda: copy.copy(base)) for chan in channels}
     if version:
+        few_days_ago = today - relativedelta(days=ndays)
         version = get_versions(channels, few_days_ago, product=product)
 
-    def handler(skip_pats, date, json, data):
-        if json['errors'] or not json['facets']['signature']:
+    data = yield from get_sgns_by_install_time_range.plan(channels, [today],
+                                                          product=product,
+                                                          query=query,
+                                                          ndays=ndays,
+                                                          version=version,
+                                                          N=N, cache=cache)
+    return data[0], version
+
+
+@collector
+def get_sgns_by_install_time_range(channels, dates, product='Firefox',
+                                   query={}, ndays=7, version=None, N=50,
+                                   cache=None):
+    """Get the top signatures for several dates
+
+    The windows of the dates overlap so each day is only queried once and
+    the windows are computed from the shared days.
+
+    Args:
+        channels (list[str]): the channels
+        dates (list): the dates
+        product (str): the product
+        query (dict): extra query parameters
+        ndays (int): the number of days before a date in its window
+        version (dict): channel => versions
+        N (int): the number of top signatures
+        cache (CountsCache): the cache for the days
+
+    Returns:
+        list[dict]: channel => Counts for each date
+    """
+    dates = [utils.get_date_ymd(date) for date in dates]
+    first = min(dates) - relativedelta(days=ndays)
+    days = [first + relativedelta(days=i)
+            for i in range((max(dates) - first).days + 1)]
+    buckets = yield from get_buckets.plan(channels, days, product=product,
+                                          query=query, version=version,
+                                          cache=cache)
+    return get_windows(buckets, dates, product, ndays=ndays, N=N)
+
+
+@collector
+def get_buckets(channels, days, product='Firefox', query={}, version=None,
+                cache=None):
+    """Get the numbers of crashes by signature for each day
+
+    Args:
+        channels (list[str]): the channels
+        days (list[datetime]): the days
+        product (str): the product
+        query (dict): extra query parameters
+        version (dict): channel => versions
+        cache (CountsCache): the cache for the days
+
+    Returns:
+        dict: channel => day => signature => number of installs (a day is
+              missing when its query failed)
+    """
+    logger.info('Get crashes numbers for {}: started.'.format(product))
+    limit = config.get_limit()
+    # each query has its own bucket: the handlers run in different threads
+    # and a bucket is only set when the query succeeded
+    buckets = {chan: {} for chan in channels}
+
+    def handler(day, json, data):
+        if json['errors']:
             return
 
+        counts = {}
         for facets in json['facets']['signature']:
             sgn = facets['term']
-            if any(p.match(sgn) for p in skip_pats):
-                continue
             count = facets['facets']['cardinality_install_time']['value']
-            data[sgn][date] = count
+            counts[sgn] = count
+        data[day] = counts
 
     params = {'product': product,
               'date': '',
@@ -235,39 +562,143 @@ def get_sgns_by_install_time(channels, product='Firefox',
               '_facets_size': limit}
     params.update(query)
 
+    searches = []
+    cached = {}
     for chan in channels:
         params = copy.deepcopy(params)
         params['release_channel'] = chan
-        skip_pats = config.get_skiplist_channel(chan)
         if version:
             params['version'] = version[chan]
         if chan != 'nightly':
             params['submitted_from_infobar'] = '!__true__'
-        for i in range(ndays + 1):
-            day = few_days_ago + relativedelta(days=i)
+        if cache is not None:
+            key = cache.get_key(params)
+            with metrics.timer('cache.get'):
+                buckets[chan] = cache.get(product, chan, key, days)
+            cached[chan] = (key, set(buckets[chan].keys()))
+        for day in days:
+            if day in buckets[chan]:
+                continue
             day_after = day + relativedelta(days=1)
             search_date = socorro.SuperSearch.get_search_date(day, day_after)
             params = copy.deepcopy(params)
             params['date'] = search_date
-            hdler = functools.partial(handler, skip_pats, day)
-            socorro.SuperSearch(params=params,
-                                handler=hdler,
-                                handlerdata=data[chan]).wait()
-        gather(data[chan])
-        data[chan] = get_top_signatures(data[chan], product, chan, N=N)
+            hdler = functools.partial(handler, day)
+            searches.append((params, hdler, buckets[chan]))
+
+    if cache is not None:
+        ncached = len(channels) * len(days) - len(searches)
+        logger.info('Get crashes numbers for {}: {} queries ({} days in the '
+                    'cache).'.format(product, len(searches), ncached))
+
+    yield searches
+
+    for chan, (key, old) in cached.items():
+        new = {day: counts for day, counts in buckets[chan].items()
+               if day not in old}
+        with metrics.timer('cache.put'):
+            cache.put(product, chan, key, new)
 
     logger.info('Get crashes numbers: finished.')
-    return data, version
+    return buckets
+
+
+def get_windows(buckets, dates, product, ndays=7, N=50):
+    """Get the top signatures for several dates from the days of data
+
+    Args:
+        buckets (dict): channel => day => signature => number of installs
+        dates (list[datetime]): the dates
+        product (str): the product
+        ndays (int): the number of days before a date in its window
+        N (int): the number of top signatures
+
+    Returns:
+        list[dict]: channel => Counts for each date
+    """
+    res = [{} for _ in dates]
+    for chan, days in buckets.items():
+        with metrics.timer('stats'):
+            skip = config.get_skipper(chan)
+            for i, date in enumerate(dates):
+                window = [date - relativedelta(days=ndays - j)
+                          for j in range(ndays + 1)]
+                data = Counts(window)
+                # the days are set in chronological order to have the same
+                # order for the signatures whatever the order of the
+                # responses is
+                for day in window:
+                    if day in days:
+                        data.set_day(day, days[day], skip=skip)
+                gather(data)
+                res[i][chan] = get_top_signatures(data, product, chan, N=N)
 
+    return res
 
+
+def get_chunks(params, signatures, max_length, max_size):
+    """Split the signatures in chunks such that the url of the query for a
+    chunk is at most max_length long
+
+    Args:
+        params (dict): the params of the query (without the signatures)
+        signatures (list[str]): the signatures
+        max_length (int): the max length of an url
+        max_size (int): the max number of signatures in a chunk
+
+    Returns:
+        list[list[str]]: the chunks
+    """
+    params = {k: v for k, v in params.items() if k != 'signature'}
+    base = len(socorro.SuperSearch.URL) + 1 + len(urlencode(params,
+                                                            doseq=True))
+    chunks = []
+    chunk = []
+    length = base
+    for sgn in signatures:
+        n = 1 + len(urlencode({'signature': '=' + sgn}))
+        if chunk and (length + n > max_length or len(chunk) == max_size):
+            chunks.append(chunk)
+            chunk = []
+            length = base
+        chunk.append(sgn)
+        length += n
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+@collector
 def get_sgns_info(sgns_by_chan, product='Firefox',
                   date='today', query={}, versions=None):
+    """Get the numbers of crashes by platform and the startup crashes for
+    some signatures
+
+    The signatures are queried by chunks whose size depends on the length of
+    the url (see max_url_length in the config). When the query for a chunk
+    fails, the chunk is split in two and the halves are queried again, so a
+    failing signature only loses its own info.
+
+    Args:
+        sgns_by_chan (dict): channel => signatures
+        product (str): the product
+        date (str): the day
+        query (dict): extra query parameters
+        versions (dict): channel => versions
+
+    Returns:
+        dict: channel => signature => info
+    """
     today = utils.get_date(date)
     tomorrow = utils.get_date(date, -1)
     data = {chan: {} for chan in sgns_by_chan.keys()}
+    failed = []
 
-    def handler(json, data):
-        if json['errors'] or not json['facets']['signature']:
+    def handler(chan, sgns, json, data):
+        if json['errors']:
+            failed.append((chan, sgns))
+            return
+        if not json['facets']['signature']:
             return
 
         for facets in json['facets']['signature']:
@@ -298,26 +729,46 @@ def get_sgns_info(sgns_by_chan, product='Firefox',
 
     base.update(query)
 
-    searches = []
+    params_by_chan = {}
+    chunks = []
+    max_length = config.get_max_url_length()
     for chan, signatures in sgns_by_chan.items():
         params = copy.copy(base)
         params['release_channel'] = chan
         if versions:
             params['version'] = versions[chan]
-        for sgns in Connection.chunks(signatures, 10):
-            p = copy.copy(params)
+        params_by_chan[chan] = params
+        # a chunk can't have more signatures than the facets size
+        chunks += [(chan, sgns) for sgns in
+                   get_chunks(params, signatures, max_length,
+                              base['_facets_size'])]
+
+    while True:
+        searches = []
+        for chan, sgns in chunks:
+            p = copy.copy(params_by_chan[chan])
             p['signature'] = ['=' + s for s in sgns]
-            searches.append(socorro.SuperSearch(params=p,
-                                                handler=handler,
-                                                handlerdata=data[chan]))
+            hdler = failsafe(functools.partial(handler, chan, sgns))
+            searches.append((p, hdler, data[chan]))
 
-    for s in searches:
-        s.wait()
+        del failed[:]
+        yield searches
+
+        chunks = []
+        for chan, sgns in failed:
+            if len(sgns) == 1:
+                logger.warning('Get signatures info: the query failed for '
+                               '{} on {}.'.format(sgns[0], chan))
+            else:
+                half = len(sgns) // 2
+                chunks += [(chan, sgns[:half]), (chan, sgns[half:])]
+        if not chunks:
+            break
 
     return data
 
 
-def get_outliers(stats, diff=diftors.diff, noutliers=5):
+def get_outliers(stats, diff=diftors.diff, noutliers=5, alpha=0.01):
     delta = {}
     infinite = []
     for sgn, numbers in stats.items():
@@ -330,7 +781,7 @@ def get_outliers(stats, diff=diftors.diff, noutliers=5):
 
     sgns = sorted(delta.items(), key=lambda p: p[0])
     x = [float(n) for _, n in sgns]
-    outliers = tools.generalized_esd(x, noutliers, alpha=0.01, method='mean')
+    outliers = tools.generalized_esd(x, noutliers, alpha=alpha, method='mean')
     return [sgns[i][0] for i in outliers], infinite
 
 
@@ -344,20 +795,21 @@ def is_spiking(data, coeff, win):
     return spikes
 
 
-def get_spiking_signatures(data, coeff, winmin, winmax):
+def get_spiking_signatures(data, coeff, winmin, winmax, alpha=0.05):
     spikes = defaultdict(lambda: list())
     for chan, stats in data.items():
-        globalstats = tools.get_global(stats, coeff, winmin, winmax)
-        for sgn, numbers in stats.items():
-            res = tools.is_sgn_spiking(numbers, globalstats, coeff,
-                                       winmin, winmax, sgn=sgn)
-            if res:
-                win, diff = res
-                info = {'signature': sgn,
-                        'numbers': numbers,
-                        'win': win,
-                        'diff': diff}
-                spikes[chan].append(info)
+        globalstats = tools.get_global(stats, coeff, winmin, winmax,
+                                       alpha=alpha)
+        wins, diffs = tools.are_sgns_spiking(stats.matrix, globalstats,
+                                             coeff, winmin, winmax)
+        for i in np.flatnonzero(wins):
+            sgn = stats.signatures[i]
+            info = {'signature': sgn,
+                    'members': stats.members.get(sgn, []),
+                    'numbers': stats.matrix[i].tolist(),
+                    'win': int(wins[i]),
+                    'diff': diffs[i]}
+            spikes[chan].append(info)
 
     return spikes
 
@@ -403,28 +855,115 @@ def plot(data, coeff, win):
     plt.show()
 
 
-def get_bugs(signatures):
+def get_bugs_plan(signatures, cache=None):
+    """The plan to get the bugs of some signatures
+
+    Like the plans of the searches, the plan yields what must be queried:
+    ('signatures', the signatures) to get back signature => list of bug ids,
+    then ('bugs', the bug ids) to get back bug id => status. The cached
+    signatures and bugs aren't queried.
+
+    Args:
+        signatures (list[str]): the signatures
+        cache (BugsCache): the cache for the bugs and their statuses
+
+    Returns:
+        dict: signature => {'resolved': ..., 'unresolved': ...}
+    """
     N = len(signatures)
     logger.info('Get bugs for {} signatures: started.'.format(N))
-    bugs_by_signature = socorro.Bugs.get_bugs(list(signatures))
+    signatures = list(signatures)
+    bugs_by_signature = cache.get_bugs(signatures) if cache else {}
+    sgns = [s for s in signatures if s not in bugs_by_signature]
+    if sgns:
+        new = {s: [] for s in sgns}
+        new.update((yield 'signatures', sgns))
+        bugs_by_signature.update(new)
+        if cache:
+            cache.put_bugs(new)
+
+    bugs = get_bug_ids(bugs_by_signature)
+    statuses = cache.get_statuses(bugs) if cache else {}
+    bugs = [b for b in bugs if b not in statuses]
+    if bugs:
+        # the inaccessible bugs have a None status
+        new = {b: None for b in bugs}
+        new.update((yield 'bugs', bugs))
+        statuses.update(new)
+        if cache:
+            cache.put_statuses(new)
+
+    bugs_by_signature = get_bugs_info(bugs_by_signature, statuses)
+
+    if cache:
+        cache.log()
+    logger.info('Get bugs: finished.')
+
+    return bugs_by_signature
+
+
+def query_bugs(kind, keys):
+    """Query what a bugs plan needs (see get_bugs_plan)"""
+    if kind == 'signatures':
+        # same as socorro.Bugs.get_bugs but with a metered connection
+        def sgns_handler(json, data):
+            for hit in json['hits']:
+                if hit['signature'] in data:
+                    data[hit['signature']].add(hit['id'])
+
+        bugs = {s: set() for s in keys}
+        queries = [Query(socorro.Bugs.URL, {'signatures': sgns},
+                         sgns_handler, bugs)
+                   for sgns in Connection.chunks(keys, 10)]
+        with metrics.timer('socorro.Bugs'):
+            metered(socorro.Bugs, 'socorro.Bugs')(queries=queries).wait()
+        return {s: sorted(b) for s, b in bugs.items()}
+
+    def handler(bug, data):
+        data[bug['id']] = bug['status']
+
+    statuses = {}
+    with metrics.timer('bugzilla'):
+        metered(Bugzilla, 'bugzilla')(bugids=keys,
+                                      include_fields=['id', 'status'],
+                                      bughandler=handler,
+                                      bugdata=statuses).wait()
+    return statuses
+
+
+def get_bugs(signatures, cache=None):
+    plan = get_bugs_plan(signatures, cache=cache)
+    try:
+        step = next(plan)
+        while True:
+            step = plan.send(query_bugs(*step))
+    except StopIteration as e:
+        return e.value
+
+
+def get_bug_ids(bugs_by_signature):
     bugs = set()
     for b in bugs_by_signature.values():
         bugs = bugs.union(set(b))
-    bugs = list(sorted(bugs))
+    return list(sorted(bugs))
 
-    def handler(bug, data):
-        data[bug['id']] = bug['status']
 
-    data = {}
-    Bugzilla(bugids=bugs, include_fields=['id', 'status'],
-             bughandler=handler, bugdata=data).wait()
+def get_bugs_info(bugs_by_signature, statuses):
+    """Get the last resolved and unresolved bugs for each signature
 
+    Args:
+        bugs_by_signature (dict): signature => list of bug ids
+        statuses (dict): bug id => status
+
+    Returns:
+        dict: signature => {'resolved': ..., 'unresolved': ...}
+    """
     for s, bugs in bugs_by_signature.items():
         resolved = []
         unresolved = []
         for b in bugs:
             b = int(b)
-            status = data.get(b, None)
+            status = statuses.get(b, None)
             if status in ['RESOLVED', 'VERIFIED', 'CLOSED']:
                 resolved.append(b)
             elif status is not None:
@@ -444,10 +983,7 @@ def get_bugs(signatures):
         else:
             last_unresolved = None
 
-        unresolved = sorted(unresolved)
         bugs_by_signature[s] = {'resolved': last_resolved,
                                 'unresolved': last_unresolved}
 
-    logger.info('Get bugs: finished.'.format(N))
-
     return bugs_by_signature
@@ -3,6 +3,7 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from spikes import utils, models, signatures
+from spikes.webcache import cache
 from flask import request, render_template
 
 
@@ -13,14 +14,18 @@ def sgns():
     date = utils.get_correct_date(date)
     channel = request.args.get('channel', '')
     channel = utils.get_correct_channel(channel)
-    data = models.Signatures.get(product, channel, date)
-    signatures.prepare_for_html(data, product, channel)
 
-    return render_template('signatures.html',
-                           product=product,
-                           products=utils.get_products(),
-                           channel=channel,
-                           channels=utils.get_channels(),
-                           date=data['date'],
-                           dates=models.Signatures.listdates(),
-                           data=data)
+    def make():
+        data = models.Signatures.get(product, channel, date)
+        signatures.prepare_for_html(data, product, channel)
+
+        return render_template('signatures.html',
+                               product=product,
+                               products=utils.get_products(),
+                               channel=channel,
+                               channels=utils.get_channels(),
+                               date=data['date'],
+                               dates=models.Signatures.listdates(),
+                               data=data)
+
+    return cache.get(('html', product, channel, date), make)
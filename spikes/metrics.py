@@ -0,0 +1,220 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from contextlib import contextmanager
+import datetime
+import functools
+import threading
+import time
+from spikes import config, db
+from .logger import logger
+
+
+def get_nfacets(json):
+    """Get the number of facet terms in a SuperSearch response (recursively)
+
+    Args:
+        json (dict): the response
+
+    Returns:
+        int: the number of terms
+    """
+    n = 0
+    facets = json.get('facets') if isinstance(json, dict) else None
+    if isinstance(facets, dict):
+        for terms in facets.values():
+            if isinstance(terms, list):
+                n += len(terms)
+                for term in terms:
+                    n += get_nfacets(term)
+    return n
+
+
+def get_nretries(response):
+    """Get the number of times urllib3 retried a query (redirects excepted)
+
+    Args:
+        response (requests.Response): the final response
+
+    Returns:
+        int: the number of retries
+    """
+    retries = getattr(response.raw, 'retries', None)
+    if retries is None:
+        return 0
+    return sum(1 for h in retries.history if not h.redirect_location)
+
+
+class MeteredSession(object):
+    """Wrap the session of a libmozdata connection to add the size and the
+    number of retries of its responses to the metrics.
+
+    libmozdata passes its own response hook to each query (which replaces
+    the ones of the session) so the hook is wrapped here.
+    """
+
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+
+    def get(self, url, hooks=None, **kwargs):
+        cb = (hooks or {}).get('response')
+
+        def hook(res, *args, **kwargs):
+            metrics.add_payload(self.name, len(res.content),
+                                get_nretries(res))
+            if cb is not None:
+                return cb(res, *args, **kwargs)
+
+        return self.session.get(url, hooks={'response': hook}, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+@functools.lru_cache(maxsize=None)
+def metered(cls, name):
+    """Get a subclass of the libmozdata connection cls whose responses are
+    measured under name in the metrics (see MeteredSession)
+
+    Args:
+        cls (type): a libmozdata Connection class
+        name (str): the name in the metrics
+
+    Returns:
+        type: the subclass
+    """
+
+    class Metered(cls):
+
+        def exec_queries(self, *args, **kwargs):
+            # the queries are executed in the constructor of the connection
+            if not isinstance(self.session, MeteredSession):
+                self.session = MeteredSession(self.session, name)
+            return super(Metered, self).exec_queries(*args, **kwargs)
+
+    Metered.__name__ = cls.__name__
+    return Metered
+
+
+class Metrics(object):
+    """Timings of the queries (Socorro, Bugzilla, ...) and of the phases of
+    a run.
+
+    For each name, the number of calls, the total and max wall times, the
+    payload size, the number of facets and the number of retries are
+    accumulated. The size and the retries are only known for the HTTP
+    queries (see add_payload).
+    """
+
+    FIELDS = ['count', 'time', 'max_time', 'size', 'facets', 'retries']
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.started = datetime.datetime.utcnow()
+
+    def add(self, name, duration, size=0, facets=0, retries=0):
+        with self.lock:
+            s = self.stats.get(name)
+            if s is None:
+                s = self.stats[name] = dict.fromkeys(Metrics.FIELDS, 0)
+            s['count'] += 1
+            s['time'] += duration
+            s['max_time'] = max(s['max_time'], duration)
+            s['size'] += size
+            s['facets'] += facets
+            s['retries'] += retries
+
+    def add_payload(self, name, size, retries=0):
+        """Add the size and the retries of a response to the timings of the
+        query which got it"""
+        with self.lock:
+            s = self.stats.get(name)
+            if s is None:
+                s = self.stats[name] = dict.fromkeys(Metrics.FIELDS, 0)
+            s['size'] += size
+            s['retries'] += retries
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def to_dict(self):
+        with self.lock:
+            return {name: dict(s) for name, s in self.stats.items()}
+
+    def log(self):
+        stats = self.to_dict()
+        logger.info('Run metrics:')
+        for name in sorted(stats):
+            s = stats[name]
+            line = '  {}: {} calls, {:.3f}s (max {:.3f}s)'.format(
+                name, s['count'], s['time'], s['max_time'])
+            if s['size'] or s['facets']:
+                line += ', {} bytes, {} facets, {} retries'.format(
+                    s['size'], s['facets'], s['retries'])
+            logger.info(line + '.')
+
+
+class Run(db.Model):
+    __tablename__ = 'runs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    started = db.Column(db.DateTime)
+    duration = db.Column(db.Float)
+    metrics = db.Column(db.JSON)
+
+    def __init__(self, started, duration, metrics):
+        self.started = started
+        self.duration = duration
+        self.metrics = metrics
+
+    def __repr__(self):
+        s = '<Run id: {}, started: {}, duration: {}>'
+        return s.format(self.id, self.started, self.duration)
+
+    @staticmethod
+    def put(m, duration, keep=None):
+        """Put a run and remove the old ones
+
+        Args:
+            m (Metrics): the metrics of the run
+            duration (float): the duration of the run
+            keep (int): the number of runs to keep (default from the config)
+
+        Returns:
+            int: the number of removed runs
+        """
+        if keep is None:
+            keep = config.get_max_runs()
+        db.session.add(Run(m.started, duration, m.to_dict()))
+        db.session.flush()
+        # the id of the newest run to remove
+        last = db.session.query(Run.id).order_by(Run.id.desc())
+        last = last.offset(keep).limit(1).scalar()
+        n = 0
+        if last is not None:
+            n = db.session.query(Run).filter(Run.id <= last).delete()
+        db.session.commit()
+
+        return n
+
+    @staticmethod
+    def get_last(n=10):
+        qs = db.session.query(Run).order_by(Run.id.desc()).limit(n)
+        return [{'started': q.started.isoformat(),
+                 'duration': q.duration,
+                 'metrics': q.metrics} for q in qs]
+
+
+metrics = Metrics()
@@ -2,11 +2,18 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import asyncio
+import time
 from dateutil.relativedelta import relativedelta
-from spikes import app, db, tools
+from spikes import app, config, db, tools
+from spikes import aiocollector as aio
 from spikes import utils as sputils
 from spikes import datacollector as dc
-from sqlalchemy import distinct
+from spikes.bugcache import BugsCache
+from spikes.cache import DBCountsCache
+from spikes.metrics import metrics, Run
+from spikes.webcache import Generation
+from sqlalchemy import distinct, inspect, literal_column, or_, text
 import sqlalchemy.dialects.postgresql as pg
 from .logger import logger
 
@@ -18,6 +25,9 @@ NDAYS_OF_DATA = 4
 
 class Signatures(db.Model):
     __tablename__ = 'signatures'
+    __table_args__ = (db.Index('ix_signatures_pc_date_signature',
+                               'pc', 'date', 'signature', unique=True),
+                      db.Index('ix_signatures_date', 'date'))
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     pc = db.Column(db.String(3))
@@ -29,9 +39,10 @@ class Signatures(db.Model):
     version = db.Column(db.String(196))
     bug_o = db.Column(db.Integer, default=0)
     bug_c = db.Column(db.Integer, default=0)
+    members = db.Column(pg.ARRAY(db.String(512)))
 
     def __init__(self, product, channel, version,
-                 date, signature, numbers, bug_o, bug_c):
+                 date, signature, numbers, bug_o, bug_c, members=None):
         self.pc = Signatures.get_pc(product, channel)
         self.version = sputils.get_versions_str(version)
         self.date = sputils.get_date(date)
@@ -41,6 +52,7 @@ class Signatures(db.Model):
         self.exp3 = tools.explosiveness(numbers, 3, 7)
         self.bug_o = bug_o
         self.bug_c = bug_c
+        self.members = members
 
     def __repr__(self):
         s = '<Signature id: {}, pc: {}, date: {}, sgn: {}, num: {}, ver: {}, b_o: {}, b_c: {}>' # NOQA
@@ -78,60 +90,110 @@ class Signatures(db.Model):
         return c
 
     @staticmethod
-    def put_data(data, bugs, date, versions):
+    def get_row(pc, version, date, signature, numbers, bug, members=None):
+        return {'pc': pc,
+                'version': version,
+                'date': date,
+                'signature': signature,
+                'numbers': numbers,
+                'exp1': float(tools.explosiveness(numbers, 1, 7)),
+                'exp3': float(tools.explosiveness(numbers, 3, 7)),
+                'bug_o': sputils.get_bug_number(bug['unresolved']),
+                'bug_c': sputils.get_bug_number(bug['resolved']),
+                'members': members or None}
+
+    @staticmethod
+    def get_upsert(rows):
+        """Get an INSERT ... ON CONFLICT DO UPDATE statement for the rows
+
+        An existing row is only updated when its numbers, its bugs or its
+        members have changed (the version isn't updated). The statement
+        returns a row (inserted,) for each inserted or updated row.
+
+        Args:
+            rows (list[dict]): the rows (see get_row)
+
+        Returns:
+            the statement
+        """
+        table = Signatures.__table__
+        ins = pg.insert(table).values(rows)
+        new = ins.excluded
+        changed = or_(table.c.numbers.is_distinct_from(new.numbers),
+                      table.c.bug_o.is_distinct_from(new.bug_o),
+                      table.c.bug_c.is_distinct_from(new.bug_c),
+                      table.c.members.is_distinct_from(new.members))
+        ins = ins.on_conflict_do_update(index_elements=['pc', 'date',
+                                                        'signature'],
+                                        set_={'numbers': new.numbers,
+                                              'exp1': new.exp1,
+                                              'exp3': new.exp3,
+                                              'bug_o': new.bug_o,
+                                              'bug_c': new.bug_c,
+                                              'members': new.members},
+                                        where=changed)
+        # xmax is 0 for a row which has just been inserted
+        inserted = (literal_column('xmax') == 0).label('inserted')
+        return ins.returning(inserted)
+
+    @staticmethod
+    def put_data(data, bugs, date, versions, commit=True):
+        """Put the data for a day in the db in a single transaction
+
+        The signatures which aren't in the data anymore are deleted and
+        the others are inserted or updated.
+
+        Args:
+            data (dict): product => channel => Counts (or signature =>
+                         numbers)
+            bugs (dict): signature => {'resolved': ..., 'unresolved': ...}
+            date (str): the date
+            versions (dict): product => channel => versions
+            commit (bool): if False, the caller commits the transaction
+
+        Returns:
+            dict: the numbers of inserted, updated and deleted rows
+                  (None if there is no data)
+        """
+        if not data:
+            return None
         d = sputils.get_date(date)
-        if data:
-            for product, info1 in data.items():
-                for channel, info2 in info1.items():
-                    pc = Signatures.get_pc(product, channel)
-                    qs = db.session.query(Signatures).filter_by(pc=pc,
-                                                                date=d)
-                    new_sgns = set(info2.keys())
-                    to_update = {}
-                    for q in qs:
-                        sgn = q.signature
-                        if sgn in new_sgns:
-                            to_update[sgn] = q
-                        else:
-                            db.session.delete(q)
-                            db.session.commit()
-                    to_create = new_sgns - set(to_update.keys())
-
-                    for sgn, q in to_update.items():
-                        numbers = info2[sgn]
-                        bug = bugs[sgn]
-                        if q.numbers != numbers:
-                            q.numbers = numbers
-                            q.exp1 = tools.explosiveness(numbers, 1, 7)
-                            q.exp3 = tools.explosiveness(numbers, 3, 7)
-                        bug_o = sputils.get_bug_number(bug['unresolved'])
-                        if q.bug_o != bug_o:
-                            q.bug_o = bug_o
-                        bug_c = sputils.get_bug_number(bug['resolved'])
-                        if q.bug_c != bug_c:
-                            q.bug_c = bug_c
-
-                    if versions and versions[product]:
-                        v = versions[product][channel]
-                    else:
-                        v = []
-
-                    for sgn in to_create:
-                        bug = bugs[sgn]
-                        bug_o = sputils.get_bug_number(bug['unresolved'])
-                        bug_c = sputils.get_bug_number(bug['resolved'])
-                        q = Signatures.put(product,
-                                           channel,
-                                           v,
-                                           date,
-                                           sgn,
-                                           info2[sgn],
-                                           bug_o,
-                                           bug_c,
-                                           commit=True)
+        table = Signatures.__table__
+        stats = {'inserted': 0, 'updated': 0, 'deleted': 0}
+        for product, info1 in data.items():
+            for channel, info2 in info1.items():
+                pc = Signatures.get_pc(product, channel)
+                if versions and versions[product]:
+                    v = versions[product][channel]
+                else:
+                    v = []
+                v = sputils.get_versions_str(v)
+                sgns = list(info2.keys())
+                # the signatures gathered in the merged ones
+                members = getattr(info2, 'members', {})
+                rows = [Signatures.get_row(pc, v, d, sgn,
+                                           info2[sgn], bugs[sgn],
+                                           members=members.get(sgn))
+                        for sgn in sgns]
+
+                q = table.delete().where(table.c.pc == pc,
+                                         table.c.date == d)
+                if sgns:
+                    q = q.where(table.c.signature.notin_(sgns))
+                stats['deleted'] += db.session.execute(q).rowcount
+
+                if rows:
+                    res = db.session.execute(Signatures.get_upsert(rows))
+                    for inserted, in res:
+                        stats['inserted' if inserted else 'updated'] += 1
+        if commit:
             db.session.commit()
-            return True
-        return False
+        logger.info('Put data for {}: {} inserted, {} updated and {} '
+                    'deleted rows.'.format(d, stats['inserted'],
+                                           stats['updated'],
+                                           stats['deleted']))
+
+        return stats
 
     @staticmethod
     def get(product, channel, date, sgn=''):
@@ -161,7 +223,8 @@ class Signatures(db.Model):
                                      'exp1': c.exp1,
                                      'exp3': c.exp3,
                                      'unresolved': c.bug_o,
-                                     'resolved': c.bug_c}
+                                     'resolved': c.bug_c,
+                                     'members': c.members or []}
 
             return r
 
@@ -177,19 +240,21 @@ class Signatures(db.Model):
         return list(dates)
 
 
-def update(date='today'):
-    logger.info('Update data for {}: started.'.format(date))
+def collect(date='today'):
     channels = sputils.get_channels()
     data = {p: None for p in sputils.get_products()}
     versions = {}
     signatures = set()
+    bugs_by_signature = {}
+    cache = DBCountsCache()
     for prod in data.keys():
         sgns, v = dc.get_sgns_by_install_time(channels,
                                               product=prod,
                                               date=date,
                                               ndays=NDAYS,
                                               version=False,
-                                              N=NSGNS)
+                                              N=NSGNS,
+                                              cache=cache)
         data[prod] = sgns
         if v:
             versions[prod] = v
@@ -197,22 +262,207 @@ def update(date='today'):
             signatures |= set(info.keys())
 
     if signatures:
-        bugs_by_signature = dc.get_bugs(signatures)
-        Signatures.rm(date)
-        Signatures.put_data(data, bugs_by_signature, date, versions)
+        bugs_by_signature = dc.get_bugs(signatures, cache=BugsCache())
+
+    return data, versions, bugs_by_signature
+
+
+async def acollect(date='today'):
+    channels = sputils.get_channels()
+    products = sputils.get_products()
+    versions = {}
+    signatures = set()
+    bugs_by_signature = {}
+    cache = DBCountsCache()
+    async with aio.Session() as session:
+        res = await asyncio.gather(*[
+            aio.get_sgns_by_install_time(session,
+                                         channels,
+                                         product=prod,
+                                         date=date,
+                                         ndays=NDAYS,
+                                         version=False,
+                                         N=NSGNS,
+                                         cache=cache) for prod in products])
+        data = {}
+        for prod, (sgns, v) in zip(products, res):
+            data[prod] = sgns
+            if v:
+                versions[prod] = v
+            for info in sgns.values():
+                signatures |= set(info.keys())
+
+        if signatures:
+            bugs_by_signature = await aio.get_bugs(session, signatures,
+                                                   cache=BugsCache())
+
+    return data, versions, bugs_by_signature
+
+
+def get_cache_ndays():
+    """Get the number of days before a date which are read from the counts
+    cache (the windows of the signatures and the histograms of the
+    installs)"""
+    return max(NDAYS + config.get_mutable_days(),
+               7 * dc.INSTALLS_WEEKS + 1)
+
 
-    logger.info('Update data for {}: finished.'.format(date))
+def update(date='today', asynchronous=False):
+    logger.info('Update data for {}: started.'.format(date))
+    metrics.reset()
+    start = time.perf_counter()
+    with metrics.timer('update.collect'):
+        if asynchronous:
+            data, versions, bugs_by_signature = asyncio.run(acollect(date))
+        else:
+            data, versions, bugs_by_signature = collect(date=date)
+
+    stats = None
+    if bugs_by_signature:
+        with metrics.timer('update.put_data'):
+            Signatures.rm(date)
+            stats = Signatures.put_data(data, bugs_by_signature, date,
+                                        versions)
+            # invalidate the cached web responses
+            Generation.bump()
+
+    with metrics.timer('update.prune'):
+        n = DBCountsCache().prune(sputils.get_date(date), get_cache_ndays())
+        logger.info('Remove {} buckets from the cache.'.format(n))
+
+    duration = time.perf_counter() - start
+    metrics.log()
+    Run.put(metrics, duration)
+    logger.info('Update data for {}: finished in {:.2f}s.'.format(date,
+                                                                  duration))
+
+    return stats
+
+
+def backfill(start, end='today', workers=None):
+    """Put the data for all the dates between start and end (included)
+
+    The windows of the dates overlap: each day is queried once (with at
+    most workers queries in flight) and the data for all the dates are put
+    in the db in a single transaction.
+
+    Args:
+        start (str): the first date
+        end (str): the last date
+        workers (int): the max number of concurrent queries
+
+    Returns:
+        dict: the numbers of inserted, updated and deleted rows
+              (None if there is no data)
+    """
+    start = sputils.get_date(start)
+    end = sputils.get_date(end)
+    dates = [(start + relativedelta(days=i)).strftime('%Y-%m-%d')
+             for i in range((end - start).days + 1)]
+    logger.info('Backfill data from {} to {}: started.'.format(start, end))
+    metrics.reset()
+    channels = sputils.get_channels()
+    data = {date: {} for date in dates}
+    signatures = set()
+    cache = DBCountsCache()
+    with metrics.timer('backfill.collect'):
+        for prod in sputils.get_products():
+            res = dc.get_sgns_by_install_time_range(channels, dates,
+                                                    product=prod,
+                                                    ndays=NDAYS,
+                                                    N=NSGNS,
+                                                    cache=cache,
+                                                    workers=workers)
+            for date, sgns in zip(dates, res):
+                data[date][prod] = sgns
+                for info in sgns.values():
+                    signatures |= set(info.keys())
+
+        if not signatures:
+            return None
+        bugs_by_signature = dc.get_bugs(signatures, cache=BugsCache())
 
+    stats = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    with metrics.timer('backfill.put_data'):
+        for date in dates:
+            s = Signatures.put_data(data[date], bugs_by_signature, date, {},
+                                    commit=False)
+            for k, v in s.items():
+                stats[k] += v
+        db.session.commit()
+        Generation.bump()
 
-def redo(date='today'):
-    d = sputils.get_date(date)
+    metrics.log()
+    logger.info('Backfill data from {} to {}: finished.'.format(start, end))
+
+    return stats
+
+
+def redo(date='today', workers=None):
+    end = sputils.get_date(date)
+    start = end - relativedelta(days=NDAYS_OF_DATA - 1)
     for i in range(NDAYS_OF_DATA):
-        update(date=d.strftime('%Y-%m-%d'))
-        d -= relativedelta(days=1)
-    
+        Signatures.rm(end - relativedelta(days=i))
+    backfill(start, end=end, workers=workers)
+
+
+def rm_duplicates(engine):
+    """Remove the duplicated signatures (same pc, date and signature)
+
+    The last inserted row (i.e. the one with the greatest id) is kept.
+
+    Args:
+        engine: the db engine
+
+    Returns:
+        int: the number of deleted rows
+    """
+    a = Signatures.__table__
+    b = a.alias('b')
+    q = a.delete().where(a.c.pc == b.c.pc,
+                         a.c.date == b.c.date,
+                         a.c.signature == b.c.signature,
+                         a.c.id < b.c.id)
+    with engine.begin() as conn:
+        return conn.execute(q).rowcount
+
+
+def migrate(engine):
+    """Create the columns and the indexes declared on the models which don't
+    exist yet
+
+    Args:
+        engine: the db engine
+    """
+    inspector = inspect(engine)
+    for table in db.Model.metadata.sorted_tables:
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            logger.info('Add column {}.{}.'.format(table.name, column.name))
+            t = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                    table.name, column.name, t)))
+        existing = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.name in existing:
+                continue
+            if table is Signatures.__table__ and index.unique:
+                n = rm_duplicates(engine)
+                logger.info('Remove {} duplicated signatures.'.format(n))
+            logger.info('Create index {}: started.'.format(index.name))
+            index.create(bind=engine)
+            logger.info('Create index {}: finished.'.format(index.name))
+
 
 def create(date='today'):
     engine = db.get_engine(app)
     if not engine.dialect.has_table(engine, 'signatures'):
         db.create_all()
         redo()
+    else:
+        # create the new tables (e.g. the cache) if any
+        db.create_all()
+        migrate(engine)
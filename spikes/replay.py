@@ -0,0 +1,263 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+from collections import defaultdict
+import time
+from dateutil.relativedelta import relativedelta
+from libmozdata import utils
+import numpy as np
+from . import datacollector as dc
+from . import startup
+from . import utils as sputils
+from .logger import logger
+
+
+# signatures.get and startup.get query the last 11 days and the last day
+NDAYS = 11
+NDAYS_STARTUP = 1
+INSTALLS_WEEKS = dc.INSTALLS_WEEKS
+
+
+def get_days(start, end):
+    start = utils.get_date_ymd(start)
+    end = utils.get_date_ymd(end)
+    return [start + relativedelta(days=i)
+            for i in range((end - start).days + 1)]
+
+
+def get_strs(x):
+    return [utils.get_date_str(d) for d in x]
+
+
+def encode_buckets(arrays, prefix, days, buckets):
+    """Put the buckets of a channel in some arrays
+
+    The counts are stored as a sparse matrix (day, signature, count) where
+    the entries of a day are in the order of the response.
+    """
+    sgns = {}
+    entries = []
+    for i, day in enumerate(days):
+        for sgn, count in buckets.get(day, {}).items():
+            j = sgns.setdefault(sgn, len(sgns))
+            entries.append((i, j, count))
+    entries = np.array(entries, dtype=np.int64).reshape(-1, 3)
+    arrays[prefix + 'fetched'] = np.array([d in buckets for d in days])
+    arrays[prefix + 'signatures'] = np.frombuffer('\n'.join(sgns).encode(),
+                                                  dtype=np.uint8)
+    arrays[prefix + 'day'] = entries[:, 0].astype(np.int16)
+    arrays[prefix + 'sgn'] = entries[:, 1].astype(np.int32)
+    arrays[prefix + 'count'] = entries[:, 2].astype(np.int32)
+
+
+def decode_buckets(arrays, prefix, days):
+    sgns = arrays[prefix + 'signatures'].tobytes().decode().split('\n')
+    day = arrays[prefix + 'day']
+    sgn = arrays[prefix + 'sgn'].tolist()
+    count = arrays[prefix + 'count'].tolist()
+    bounds = np.searchsorted(day, np.arange(len(days) + 1)).tolist()
+    buckets = {}
+    for i, fetched in enumerate(arrays[prefix + 'fetched']):
+        if fetched:
+            s, e = bounds[i], bounds[i + 1]
+            buckets[days[i]] = {sgns[j]: n
+                                for j, n in zip(sgn[s:e], count[s:e])}
+    return buckets
+
+
+def dump(path, start, end='today', ndays=NDAYS, workers=None):
+    """Collect the data needed to detect the spikes between two dates and
+    save them in a compressed npz file
+
+    Args:
+        path (str): the file
+        start (str): the first date
+        end (str): the last date
+        ndays (int): the number of days before a date to collect
+        workers (int): the max number of concurrent queries
+    """
+    dates = get_days(start, end)
+    first = dates[0] - relativedelta(days=ndays)
+    days = get_days(first, dates[-1])
+    first = dates[0] - relativedelta(days=NDAYS_STARTUP)
+    startup_days = get_days(first, dates[-1])
+    weeks = INSTALLS_WEEKS + (len(dates) + 6) // 7
+    arrays = {'dates': np.array(get_strs(dates)),
+              'ndays': np.array(ndays)}
+
+    logger.info('Dump the data from {} to {}: started.'.format(start, end))
+    channels = sputils.get_channels()
+    for product in sputils.get_products():
+        buckets = dc.get_buckets(channels, days, product=product,
+                                 workers=workers)
+        for chan in channels:
+            prefix = 'signatures/{}/{}/'.format(product, chan)
+            encode_buckets(arrays, prefix, days, buckets[chan])
+
+    for product in startup.products:
+        buckets = dc.get_buckets(startup.channels, startup_days,
+                                 product=product, query=startup.query,
+                                 workers=workers)
+        installs = dc.get_by_install_time(startup.channels, product=product,
+                                          date=dates[-1],
+                                          query=startup.query,
+                                          weeks=weeks, workers=workers)
+        for chan in startup.channels:
+            prefix = 'startup/{}/{}/'.format(product, chan)
+            encode_buckets(arrays, prefix, startup_days, buckets[chan])
+            prefix = 'installs/{}/{}/'.format(product, chan)
+            numbers = sorted(installs[chan].items())
+            arrays[prefix + 'days'] = np.array(get_strs(d for d, _ in
+                                                        numbers))
+            arrays[prefix + 'count'] = np.array([n for _, n in numbers],
+                                                dtype=np.int64)
+
+    np.savez_compressed(path, **arrays)
+    logger.info('Dump the data: finished.')
+
+
+def load(path):
+    """Load the data saved with dump
+
+    Args:
+        path (str): the file
+
+    Returns:
+        dict: the dates, the number of days before a date and:
+              - signatures and startup: product => channel => day =>
+                signature => number of installs
+              - installs: product => channel => day => number of installs
+    """
+    with np.load(path) as arrays:
+        dates = [utils.get_date_ymd(d) for d in arrays['dates']]
+        ndays = int(arrays['ndays'])
+        data = {'dates': dates,
+                'ndays': ndays,
+                'signatures': defaultdict(dict),
+                'startup': defaultdict(dict),
+                'installs': defaultdict(dict)}
+        all_days = {'signatures': get_days(dates[0] -
+                                           relativedelta(days=ndays),
+                                           dates[-1]),
+                    'startup': get_days(dates[0] -
+                                        relativedelta(days=NDAYS_STARTUP),
+                                        dates[-1])}
+        prefixes = {name[:name.rindex('/') + 1] for name in arrays.files
+                    if '/' in name}
+        for prefix in sorted(prefixes):
+            kind, product, chan, _ = prefix.split('/')
+            if kind == 'installs':
+                days = [utils.get_date_ymd(d)
+                        for d in arrays[prefix + 'days']]
+                counts = arrays[prefix + 'count'].tolist()
+                data[kind][product][chan] = dict(zip(days, counts))
+            else:
+                data[kind][product][chan] = decode_buckets(arrays, prefix,
+                                                           all_days[kind])
+
+    return data
+
+
+def get_signatures_spikes(data, date, coeff=3., winmin=7, winmax=NDAYS):
+    """Same as signatures.get (without the bugs) from the dumped data"""
+    spikes = {}
+    for product, buckets in data['signatures'].items():
+        sgns = dc.get_windows(buckets, [date], product, ndays=winmax)[0]
+        s = dc.get_spiking_signatures(sgns, coeff, winmin, winmax)
+        if s:
+            spikes[product] = s
+
+    return spikes
+
+
+def get_startup_outliers(data, date, coeff=4., win=5):
+    """Same as startup.get (without the bugs and the totals) from the
+    dumped data"""
+    significants = defaultdict(lambda: defaultdict(lambda: dict()))
+    signatures = set()
+    first = date - relativedelta(weeks=INSTALLS_WEEKS)
+    for product, installs in data['installs'].items():
+        numbers = {chan: {d: n for d, n in x.items() if first <= d <= date}
+                   for chan, x in installs.items()}
+        spikes = dc.is_spiking(numbers, coeff, win)
+        spiking = [chan for chan, res in spikes.items() if res == 'yes']
+        if spiking:
+            buckets = {chan: data['startup'][product][chan]
+                       for chan in spiking}
+            sgns = dc.get_windows(buckets, [date], product,
+                                  ndays=NDAYS_STARTUP)[0]
+            startup.add_outliers(significants, signatures, product, sgns)
+
+    return significants
+
+
+def replay(data, coeff=3., winmin=7, winmax=NDAYS,
+           startup_coeff=4., startup_win=5):
+    """Detect the spikes for each date of the dumped data
+
+    Returns:
+        list[tuple]: (date, signatures spikes, startup outliers)
+    """
+    if winmax > data['ndays']:
+        raise ValueError('The data only have {} days before a '
+                         'date'.format(data['ndays']))
+    res = []
+    for date in data['dates']:
+        spikes = get_signatures_spikes(data, date, coeff=coeff,
+                                       winmin=winmin, winmax=winmax)
+        outliers = get_startup_outliers(data, date, coeff=startup_coeff,
+                                        win=startup_win)
+        res.append((date, spikes, outliers))
+
+    return res
+
+
+def count(spikes):
+    return sum(len(x) for info in spikes.values() for x in info.values())
+
+
+if __name__ == '__main__':
+    description = 'Dump the data or detect the spikes from dumped data'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('action', choices=['dump', 'replay'],
+                        help='dump the data or replay them')
+    parser.add_argument('file', help='npz file')
+    parser.add_argument('-s', '--start', dest='start', action='store',
+                        default='today', help='first date (dump)')
+    parser.add_argument('-e', '--end', dest='end', action='store',
+                        default='today', help='last date (dump)')
+    parser.add_argument('-n', '--ndays', dest='ndays', type=int,
+                        action='store', default=NDAYS,
+                        help='days before a date (dump)')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        action='store', default=None,
+                        help='max number of concurrent queries (dump)')
+    parser.add_argument('--coeff', dest='coeff', type=float,
+                        action='store', default=3.)
+    parser.add_argument('--winmin', dest='winmin', type=int,
+                        action='store', default=7)
+    parser.add_argument('--winmax', dest='winmax', type=int,
+                        action='store', default=NDAYS)
+    parser.add_argument('--startup-coeff', dest='startup_coeff',
+                        type=float, action='store', default=4.)
+    parser.add_argument('--startup-win', dest='startup_win', type=int,
+                        action='store', default=5)
+    args = parser.parse_args()
+
+    if args.action == 'dump':
+        dump(args.file, args.start, end=args.end, ndays=args.ndays,
+             workers=args.workers)
+    else:
+        start = time.perf_counter()
+        data = load(args.file)
+        res = replay(data, coeff=args.coeff, winmin=args.winmin,
+                     winmax=args.winmax, startup_coeff=args.startup_coeff,
+                     startup_win=args.startup_win)
+        for date, spikes, outliers in res:
+            print('{}: {} spiking signatures, {} startup '
+                  'outliers'.format(utils.get_date_str(date), count(spikes),
+                                    count(outliers)))
+        print('Replayed {} dates in {:.2f}s'.format(
+            len(res), time.perf_counter() - start))
@@ -0,0 +1,128 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from contextlib import contextmanager
+import time
+from sqlalchemy import text
+from spikes import db
+from . import config
+from . import models
+from .logger import logger
+
+
+# the key of the advisory lock held while updating
+LOCK_KEY = 0x5350494b
+
+
+@contextmanager
+def update_lock(engine):
+    """Try to take a db advisory lock to have only one updater at a time
+
+    With a db other than PostgreSQL, the lock is always taken.
+
+    Args:
+        engine: the db engine
+
+    Yields:
+        bool: True if the lock has been taken
+    """
+    if engine.dialect.name != 'postgresql':
+        yield True
+        return
+
+    # autocommit: no transaction is left open while the lock is held
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        q = text('SELECT pg_try_advisory_lock(:key)')
+        locked = conn.execute(q, {'key': LOCK_KEY}).scalar()
+        try:
+            yield locked
+        finally:
+            if locked:
+                q = text('SELECT pg_advisory_unlock(:key)')
+                conn.execute(q, {'key': LOCK_KEY})
+
+
+def get_interval(duration, changed, previous, base, maximum):
+    """Get the interval before the next run
+
+    The interval gets back to base when the data changed and doubles
+    (up to maximum) when they didn't. It's never shorter than the duration
+    of the last run.
+
+    Args:
+        duration (float): the duration in seconds of the last run
+        changed (bool): True if the last run changed the data
+        previous (float): the previous interval
+        base (float): the base interval
+        maximum (float): the max interval
+
+    Returns:
+        float: the interval in seconds
+    """
+    if changed or previous is None:
+        interval = base
+    else:
+        interval = min(2 * previous, maximum)
+    return max(interval, duration)
+
+
+class Updater(object):
+    """Run models.update with a scheduler.
+
+    There is only one run at a time, the missed runs are coalesced and a
+    run is skipped when another updater holds the lock (e.g. on another
+    dyno). The interval is adapted after each run (see get_interval).
+    """
+
+    JOB_ID = 'update'
+
+    def __init__(self, scheduler, base=None, maximum=None):
+        self.scheduler = scheduler
+        self.base = base or config.get_update_interval()
+        self.maximum = maximum or config.get_max_update_interval()
+        self.interval = self.base
+
+    def start(self):
+        self.scheduler.add_job(self.run, 'interval', seconds=self.interval,
+                               id=Updater.JOB_ID, coalesce=True,
+                               max_instances=1, misfire_grace_time=None,
+                               replace_existing=True)
+
+    def update(self):
+        """Update the data if the lock can be taken
+
+        Returns:
+            bool: True if the data changed, None if the update has been
+                  skipped
+        """
+        with update_lock(db.engine) as locked:
+            if not locked:
+                logger.info('Another updater is running: skip the update.')
+                return None
+            stats = models.update()
+            return bool(stats) and any(stats.values())
+
+    def run(self):
+        start = time.perf_counter()
+        changed = None
+        try:
+            changed = self.update()
+        except Exception:
+            logger.exception('Update failed.')
+        duration = time.perf_counter() - start
+
+        # data unknown if skipped or failed: back to the base interval
+        interval = get_interval(duration,
+                                changed is None or changed,
+                                self.interval,
+                                self.base,
+                                self.maximum)
+        if interval != self.interval:
+            self.interval = interval
+            self.scheduler.reschedule_job(Updater.JOB_ID,
+                                          trigger='interval',
+                                          seconds=interval)
+        logger.info('Update run in {:.2f}s, next one in {:.0f}s.'.format(
+            duration, interval))
@@ -3,15 +3,23 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import argparse
+import asyncio
 from collections import OrderedDict
 from jinja2 import Environment, FileSystemLoader
 from libmozdata import utils, socorro
+from . import aiocollector as aio
 from . import datacollector as dc
 from . import utils as sputils
 from . import mail
 
 
-def get(date='today', ndays=11, query={}, version=False):
+def get(date='today', ndays=11, query={}, version=False,
+        asynchronous=False, bugs_cache=None):
+    if asynchronous:
+        return asyncio.run(aget(date=date, ndays=ndays,
+                                query=query, version=version,
+                                bugs_cache=bugs_cache))
+
     coeff = 3.
     winmin = 7
     winmax = ndays
@@ -38,7 +46,44 @@ def get(date='today', ndays=11, query={}, version=False):
         spikes[product] = s
 
     if signatures:
-        bugs_by_signature = dc.get_bugs(signatures)
+        bugs_by_signature = dc.get_bugs(signatures, cache=bugs_cache)
+
+    return spikes, bugs_by_signature, versions
+
+
+async def aget(date='today', ndays=11, query={}, version=False,
+               bugs_cache=None):
+    coeff = 3.
+    winmin = 7
+    winmax = ndays
+    signatures = set()
+    bugs_by_signature = {}
+    spikes = {}
+    versions = {}
+    products = sputils.get_products()
+    channels = sputils.get_channels()
+    async with aio.Session() as session:
+        res = await asyncio.gather(*[
+            aio.get_sgns_by_install_time(session, channels, product=product,
+                                         date=date, query=query,
+                                         ndays=winmax, version=version)
+            for product in products])
+        for product, (data, v) in zip(products, res):
+            versions[product] = v
+            s = dc.get_spiking_signatures(data, coeff, winmin, winmax)
+
+            if not s:
+                continue
+
+            for info in s.values():
+                for i in info:
+                    signatures.add(i['signature'])
+
+            spikes[product] = s
+
+        if signatures:
+            bugs_by_signature = await aio.get_bugs(session, signatures,
+                                                   cache=bugs_cache)
 
     return spikes, bugs_by_signature, versions
 
@@ -112,19 +157,21 @@ def prepare(spikes, bugs_by_signature, date, versions, query, ndays):
                             results3['unresolved'] = bugs.get('unresolved',
                                                               None)
                             results3['url'] = url
+                            results3['members'] = stats.get('members', [])
         affected_chans = list(sorted(affected_chans))
 
         return results, affected_chans, today
     return None
 
 
-def send_email(emails=[], date='today', version=False):
+def send_email(emails=[], date='today', version=False, asynchronous=False):
     query = {}
     ndays = 11
     spikes, bugs_by_signature, versions = get(date=date,
                                               query=query,
                                               ndays=ndays,
-                                              version=version)
+                                              version=version,
+                                              asynchronous=asynchronous)
     r = prepare(spikes, bugs_by_signature, date, versions, query, ndays)
     if r:
         results, affected_chans, today = r
@@ -156,6 +203,10 @@ if __name__ == '__main__':
                         action='store', default='today', help='date')
     parser.add_argument('-v', '--version', dest='version',
                         action='store_true', help='add version to search query')
+    parser.add_argument('-a', '--asynchronous', dest='asynchronous',
+                        action='store_true',
+                        help='query all the products at once with asyncio')
     args = parser.parse_args()
 
-    send_email(emails=args.emails, date=args.date, version=args.version)
+    send_email(emails=args.emails, date=args.date, version=args.version,
+               asynchronous=args.asynchronous)
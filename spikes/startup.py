@@ -3,14 +3,18 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import argparse
+import asyncio
 from collections import defaultdict, OrderedDict
 from dateutil.relativedelta import relativedelta
 import inflect
 from jinja2 import Environment, FileSystemLoader
 from libmozdata import utils, socorro
+from . import aiocollector as aio
+from . import config
 from . import datacollector as dc
 from . import differentiators as diftors
 from . import tools, mail
+from .logger import logger
 
 
 channels = ['nightly', 'beta', 'release']
@@ -18,17 +22,29 @@ products = ['Firefox', 'Fenix', 'Thunderbird']
 query = {'startup_crash': '__true__'}
 
 
-def get(date='today'):
+def get(date='today', asynchronous=False, deadline=None, cache=None,
+        bugs_cache=None):
+    if asynchronous:
+        return asyncio.run(aget(date=date, deadline=deadline, cache=cache,
+                                bugs_cache=bugs_cache))
+
     significants = defaultdict(lambda: defaultdict(lambda: dict()))
     signatures = set()
     bugs_by_signature = {}
     totals = {}
     coeff = 4.
     win = 5
-    for product in products:
-        data = dc.get_by_install_time(channels, product=product,
-                                      date=date, query=query)
+    # two rounds of searches: the histograms of all the products, then the
+    # totals and the signatures of all the spiking channels
+    plans = [dc.get_by_install_time.plan(channels, product=product,
+                                         date=date, query=query,
+                                         cache=cache)
+             for product in products]
+    histograms = dc.run_plan(dc.batch(*plans))
 
+    plans = []
+    spiking_products = []
+    for product, data in zip(products, histograms):
         if not data:
             continue
 
@@ -39,28 +55,123 @@ def get(date='today'):
             if res == 'yes':
                 spiking.append(chan)
         if spiking:
-            totals[product] = dc.get_total(channels=spiking,
+            plans.append(dc.get_total.plan(channels=spiking,
                                            product=product,
-                                           date=date)
-            data, _ = dc.get_sgns_by_install_time(channels=spiking,
-                                                  product=product,
-                                                  date=date,
-                                                  query=query,
-                                                  ndays=1)
-            for chan, stats in data.items():
-                outliers, _ = dc.get_outliers(stats, diff=diftors.diff)
-                for o in outliers:
-                    numbers = stats[o]
-                    numbers.append(tools.get_percent(numbers[-2], numbers[-1]))
-                    significants[product][chan][o] = numbers
-                    signatures.add(o)
+                                           date=date))
+            plans.append(dc.get_sgns_by_install_time.plan(channels=spiking,
+                                                          product=product,
+                                                          date=date,
+                                                          query=query,
+                                                          ndays=1))
+            spiking_products.append(product)
+
+    res = dc.run_plan(dc.batch(*plans))
+    for i, product in enumerate(spiking_products):
+        totals[product] = res[2 * i]
+        data, _ = res[2 * i + 1]
+        add_outliers(significants, signatures, product, data)
 
     if signatures:
-        bugs_by_signature = dc.get_bugs(signatures)
+        bugs_by_signature = dc.get_bugs(signatures, cache=bugs_cache)
 
     return significants, bugs_by_signature, totals
 
 
+async def aget(date='today', deadline=None, cache=None, bugs_cache=None):
+    """Same as get but the products are processed concurrently
+
+    The histograms of all the products are queried at once and, as soon as
+    the histograms of a product are there, the signatures and the totals of
+    its spiking channels are queried.
+    The products which aren't done after deadline seconds are skipped and the
+    bugs are only queried with the remaining time.
+    The caches are used in the threads of the session (see aio.Session).
+
+    Args:
+        date (str): the date
+        deadline (float): the time budget in seconds (default: the one from
+                          the config, no deadline if 0)
+        cache (CountsCache): the cache for the histograms (none by default)
+        bugs_cache (BugsCache): the cache for the bugs (none by default)
+
+    Returns:
+        (dict, dict, dict): the significant signatures, the bugs and the
+                            totals
+    """
+    if deadline is None:
+        deadline = config.get_startup_deadline()
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline if deadline else None
+
+    def remaining():
+        return max(0., end - loop.time()) if end is not None else None
+
+    significants = defaultdict(lambda: defaultdict(lambda: dict()))
+    signatures = set()
+    bugs_by_signature = {}
+    totals = {}
+    coeff = 4.
+    win = 5
+
+    async def get_product(session, product):
+        data = await aio.get_by_install_time(session, channels,
+                                             product=product,
+                                             date=date, query=query,
+                                             cache=cache)
+
+        if not data:
+            return
+
+        spikes = dc.is_spiking(data, coeff, win)
+        spiking = []
+        for chan, res in spikes.items():
+            if res == 'yes':
+                spiking.append(chan)
+        if spiking:
+            total, (data, _) = await session.run_plan(dc.batch(
+                dc.get_total.plan(channels=spiking, product=product,
+                                  date=date),
+                dc.get_sgns_by_install_time.plan(channels=spiking,
+                                                 product=product, date=date,
+                                                 query=query, ndays=1)))
+            totals[product] = total
+            add_outliers(significants, signatures, product, data)
+
+    async with aio.Session() as session:
+        tasks = {asyncio.ensure_future(get_product(session, product)): product
+                 for product in products}
+        done, pending = await asyncio.wait(tasks, timeout=remaining())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if pending:
+            skipped = ', '.join(sorted(tasks[task] for task in pending))
+            logger.warning('Startup crashes: deadline reached, {} '
+                           'skipped.'.format(skipped))
+        for task in done:
+            task.result()
+
+        if signatures:
+            try:
+                bugs_by_signature = await asyncio.wait_for(
+                    aio.get_bugs(session, signatures, cache=bugs_cache),
+                    remaining())
+            except asyncio.TimeoutError:
+                logger.warning('Startup crashes: deadline reached, no bugs.')
+
+    return significants, bugs_by_signature, totals
+
+
+def add_outliers(significants, signatures, product, data):
+    for chan, stats in data.items():
+        outliers, _ = dc.get_outliers(stats, diff=diftors.diff)
+        for o in outliers:
+            numbers = stats[o]
+            numbers.append(tools.get_percent(numbers[-2], numbers[-1]))
+            significants[product][chan][o] = numbers
+            signatures.add(o)
+
+
 def prepare(significants, bugs_by_signature, totals, date):
     if significants:
         today = utils.get_date_ymd(date)
@@ -111,8 +222,13 @@ def prepare(significants, bugs_by_signature, totals, date):
     return None
 
 
-def send_email(emails=[], date='today'):
-    significants, bugs_by_signature, totals = get(date=date)
+def send_email(emails=[], date='today', asynchronous=False, deadline=None,
+               cache=None, bugs_cache=None):
+    significants, bugs_by_signature, totals = get(date=date,
+                                                  asynchronous=asynchronous,
+                                                  deadline=deadline,
+                                                  cache=cache,
+                                                  bugs_cache=bugs_cache)
     r = prepare(significants, bugs_by_signature, totals, date)
     if r:
         results, spikes_number, urls, affected_chans, yesterday, today = r
@@ -148,6 +264,14 @@ if __name__ == '__main__':
                         default=[], help='emails')
     parser.add_argument('-d', '--date', dest='date',
                         action='store', default='today', help='date')
+    parser.add_argument('-a', '--asynchronous', dest='asynchronous',
+                        action='store_true',
+                        help='query all the products at once with asyncio')
+    parser.add_argument('--deadline', dest='deadline', type=float,
+                        action='store', default=None,
+                        help='time budget in seconds with asyncio (0 for '
+                        'no deadline)')
     args = parser.parse_args()
 
-    send_email(emails=args.emails, date=args.date)
+    send_email(emails=args.emails, date=args.date,
+               asynchronous=args.asynchronous, deadline=args.deadline)
@@ -2,10 +2,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import functools
 import numpy as np
 import scipy.stats as stats
 
 
+# the max size of the curves computed together in multimoving
+MULTIMOVING_BLOCK = 1000000
+
+
 def get_percent(x, y):
     if x == 0:
         if y == 0:
@@ -29,6 +34,7 @@ def get_array(d):
     return d
 
 
+@functools.lru_cache(maxsize=None)
 def __get_lambda_critical(N, i, alpha):
     """Get lambda for generalized ESD test
        (http://www.itl.nist.gov/div898/handbook/eda/section3/eda35h3.htm).
@@ -39,7 +45,7 @@ def __get_lambda_critical(N, i, alpha):
         alpha (float): the signifiance level
 
     Returns:
-        list[int]: list of the index of outliers
+        float: the critical value (memoized)
     """
     p = 1. - alpha / (2. * (N - i + 1))
     t = stats.t.ppf(p, N - i - 1)
@@ -61,17 +67,18 @@ def __get_pd_median(data, c=1.):
     return p, d
 
 
-def __get_pd_mean(data, c=1.):
+def __get_pd_mean(data, c=1., axis=None):
     """Get the mean and the standard deviation of data
 
     Args:
         data (numpy.ndarray): the data
+        axis (int): the axis along which they're computed (default: all)
 
     Returns:
         float, float: the mean and the standard deviation
     """
-    p = np.nanmean(data)
-    d = np.nanstd(data) / c
+    p = np.nanmean(data, axis=axis)
+    d = np.nanstd(data, axis=axis) / c
 
     return p, d
 
@@ -90,6 +97,9 @@ def generalized_esd(x, r, alpha=0.05, method='mean'):
         list[int]: list of the index of outliers
     """
     x = np.asarray(x, dtype=np.float64)
+    if method != 'median' and np.all(np.isfinite(x) | np.isnan(x)):
+        return __generalized_esd_mean(x, r, alpha)
+
     fn = __get_pd_median if method == 'median' else __get_pd_mean
     NaN = float('nan')
     outliers = []
@@ -114,6 +124,120 @@ def generalized_esd(x, r, alpha=0.05, method='mean'):
     return outliers
 
 
+def __generalized_esd_mean(x, r, alpha):
+    """Same as generalized_esd(x, r, alpha, method='mean')
+
+    The values are sorted once: the farthest value from the mean is then
+    either the smallest or the greatest remaining one, and the mean and the
+    standard deviation are updated with running sums when a value is removed.
+    When a test is too close to call with the running sums, it's done like
+    in generalized_esd in order to have exactly the same outliers.
+    """
+    x = x.copy()
+    N = len(x)
+    valid = np.flatnonzero(~np.isnan(x))
+    # sorted by value then by index
+    order = np.lexsort((valid, x[valid]))
+    idx = valid[order]
+    vals = x[idx]
+    lo, hi = 0, len(vals) - 1
+    S = float(np.sum(vals))
+    Q = float(np.sum(vals * vals))
+    outliers = []
+
+    for i in range(1, r + 1):
+        n = hi - lo + 1
+        if n <= 0 or vals[lo] == vals[hi]:
+            # no more data or a null standard deviation
+            break
+        m = S / n
+        var = max(Q / n - m * m, 0.)
+        d_lo = m - vals[lo]
+        d_hi = vals[hi] - m
+        R = max(d_lo, d_hi)
+        lam = __get_lambda_critical(N, i, alpha)
+        left = R * R
+        right = lam * lam * var
+        near_tie = abs(d_lo - d_hi) <= 1e-9 * (abs(vals[lo]) +
+                                               abs(vals[hi]) + 1e-300)
+        near_test = abs(left - right) <= 1e-8 * (left + lam * lam * Q / n)
+        if near_tie or near_test or np.isnan(lam):
+            # do it in the same way as generalized_esd
+            m, e = __get_pd_mean(x)
+            y = np.abs(x - m)
+            j = np.nanargmax(y)
+            if not (y[j] > lam * e):
+                break
+            at_lo = x[j] == vals[lo] and (x[j] != vals[hi] or d_lo >= d_hi)
+        elif left > right:
+            at_lo = d_lo > d_hi
+        else:
+            break
+
+        if at_lo:
+            # the smallest index of the equal values is the first one
+            j = idx[lo]
+            v = vals[lo]
+            lo += 1
+        else:
+            # remove the smallest index of the greatest equal values
+            g = hi
+            while g > lo and vals[g - 1] == vals[hi]:
+                g -= 1
+            j = idx[g]
+            v = vals[hi]
+            idx[g:hi] = idx[g + 1:hi + 1]
+            hi -= 1
+        outliers.append(j)
+        x[j] = float('nan')
+        S -= v
+        Q -= v * v
+
+    return outliers
+
+
+def generalized_esd_rows(x, r, alpha=0.05):
+    """Generalized ESD test (with the mean) for each row of a matrix
+
+    All the rows are tested at once, it's the same as calling
+    generalized_esd(row, r, alpha, method='mean') for each row.
+
+    Args:
+        x (numpy.ndarray): the data (a sequence by row)
+        r (int): max number of outliers
+        alpha (float): the signifiance level
+
+    Returns:
+        list[list[int]]: the list of the index of outliers for each row
+    """
+    x = np.array(x, dtype=np.float64, ndmin=2)
+    R, N = x.shape
+    outliers = [[] for _ in range(R)]
+    active = np.ones(R, dtype=bool)
+    rows = np.arange(R)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(1, r + 1):
+            active &= ~np.all(np.isnan(x), axis=1)
+            if not np.any(active):
+                break
+            y = x[active]
+            m = np.nanmean(y, axis=1)
+            e = np.nanstd(y, axis=1)
+            z = np.abs(y - m[:, None])
+            z[np.isnan(z)] = -np.inf
+            j = np.argmax(z, axis=1)
+            k = np.arange(len(j))
+            lam = __get_lambda_critical(N, i, alpha)
+            found = (e != 0.) & (z[k, j] > lam * e)
+            act = rows[active]
+            for row, col in zip(act[found], j[found]):
+                outliers[row].append(col)
+            x[act[found], j[found]] = np.nan
+            active[act[~found]] = False
+
+    return outliers
+
+
 def ma(x, win):
     """Compute the moving average of x with a window equal to win
 
@@ -151,10 +275,8 @@ def __convert(x):
     return x
 
 
-def moving(x, f=mean, coeff=2.0):
-    x = __convert(x)
+def __get_pieces(x, f, coeff):
     pieces = [[0, 0]]
-    coeff = float(coeff)
     L = len(x)
 
     for i in range(1, L):
@@ -164,6 +286,61 @@ def moving(x, f=mean, coeff=2.0):
         else:
             pieces.append([i, i])
 
+    return pieces
+
+
+def __get_mean_pieces(x, coeff):
+    """Same as __get_pieces(x, mean, coeff) but with running sums
+
+    The sums and the sums of squares of the current piece are updated for each
+    new point, so the cost is linear. When the test is too close to call
+    with the running sums, it's done like in __get_pieces in order to have
+    exactly the same pieces.
+    """
+    pieces = [[0, 0]]
+    L = len(x)
+    if L == 0:
+        return pieces
+
+    xs = x.tolist()
+    c2 = coeff * coeff
+    S = xs[0]
+    Q = S * S
+    n = 1
+    for i in range(1, L):
+        v = xs[i]
+        S1 = S + v
+        Q1 = Q + v * v
+        n1 = n + 1
+        p = S1 / n1
+        # compare (v - p)^2 and (coeff * d)^2
+        left = (v - p) ** 2
+        right = c2 * (Q1 / n1 - p * p)
+        if abs(left - right) <= 1e-8 * (left + c2 * Q1 / n1) + 1e-12:
+            p, d = mean(x[pieces[-1][0]:(i + 1)])
+            ok = abs(x[i] - p) <= coeff * d
+        else:
+            ok = left < right
+
+        if ok:
+            pieces[-1][1] = i
+            S, Q, n = S1, Q1, n1
+        else:
+            pieces.append([i, i])
+            S, Q, n = v, v * v, 1
+
+    return pieces
+
+
+def moving(x, f=mean, coeff=2.0):
+    x = __convert(x)
+    coeff = float(coeff)
+    L = len(x)
+    if f is mean:
+        pieces = __get_mean_pieces(x, coeff)
+    else:
+        pieces = __get_pieces(x, f, coeff)
+
     yp = np.empty(L)
     yd = np.empty(L)
     pos = 0
@@ -177,12 +354,130 @@ def moving(x, f=mean, coeff=2.0):
     return yp, yd
 
 
+def __get_rows_pieces(X, lengths, coeff):
+    """Same as __get_mean_pieces for the rows of X (padded series)
+
+    The running sums of the current piece of all the rows are updated
+    together for each column.
+
+    Args:
+        X (numpy.array): the series (a series by row)
+        lengths (numpy.array): the lengths of the series
+        coeff (float): a coefficient for the tolerance relative to the disp
+
+    Returns:
+        numpy.array: True where a piece starts
+    """
+    B, L = X.shape
+    c2 = coeff * coeff
+    S = X[:, 0].copy()
+    Q = S * S
+    n = np.ones(B)
+    start = np.zeros(B, dtype=np.int64)
+    starts = np.zeros((B, L), dtype=bool)
+    starts[:, 0] = True
+    for i in range(1, L):
+        v = X[:, i]
+        S1 = S + v
+        Q1 = Q + v * v
+        n1 = n + 1.
+        p = S1 / n1
+        left = (v - p) ** 2
+        right = c2 * (Q1 / n1 - p * p)
+        ok = left < right
+        close = np.abs(left - right) <= 1e-8 * (left + c2 * Q1 / n1) + 1e-12
+        for b in np.flatnonzero(close & (lengths > i)):
+            pb, db = mean(X[b, start[b]:(i + 1)])
+            ok[b] = abs(X[b, i] - pb) <= coeff * db
+        S = np.where(ok, S1, v)
+        Q = np.where(ok, Q1, v * v)
+        n = np.where(ok, n1, 1.)
+        start = np.where(ok, start, i)
+        starts[:, i] = ~ok
+
+    return starts & (np.arange(L) < lengths[:, None])
+
+
+def __moving_rows(X, lengths, coeff):
+    """Same as moving(x, mean, coeff) for the rows of X (padded series)
+
+    The values of the pieces of the same length are computed together: the
+    sums are the ones of mean, so the results are the same as moving.
+    """
+    B, L = X.shape
+    starts = __get_rows_pieces(X, lengths, coeff)
+    rows, first = np.nonzero(starts)
+    # the length of a piece: up to the next start or to the end of the row
+    ends = np.append(first[1:], 0)
+    last = np.append(rows[1:] != rows[:-1], True)
+    ends[last] = lengths[rows[last]]
+    sizes = ends - first
+
+    p = np.empty(len(rows))
+    d = np.empty(len(rows))
+    for size in np.unique(sizes).tolist():
+        sel = np.flatnonzero(sizes == size)
+        pieces = X[rows[sel, None], first[sel, None] + np.arange(size)]
+        N = float(size)
+        p[sel] = np.sum(pieces, axis=1) / N
+        d[sel] = np.sqrt(np.sum((pieces - p[sel, None]) ** 2, axis=1) / N)
+
+    # the piece index of each point
+    index = np.cumsum(starts.ravel()).reshape(B, L) - 1
+    return p[index], d[index]
+
+
+def __multimoving_rows(x, coeff):
+    """Same as multimoving(x, mean, coeff) for the rows of x
+
+    The moving curves of all the prefixes (reversed) and of all the suffixes
+    of all the rows are computed together with __moving_rows.
+    """
+    R, L = x.shape
+    j = np.arange(L)
+    suffixes = j[:, None] + j
+    prefixes = j[:, None] - j
+    index = np.concatenate([np.minimum(suffixes, L - 1),
+                            np.maximum(prefixes, 0)])
+    lengths = np.concatenate([L - j, j + 1])
+    X = x[:, index].reshape(R * 2 * L, L)
+    ys, ds = __moving_rows(X, np.tile(lengths, R), coeff)
+    ys = ys.reshape(R, 2, L, L)
+    ds = ds.reshape(R, 2, L, L)
+
+    # the i-th curve is the moving of x[:(i + 1)][::-1] (reversed) on the
+    # left of i and the one of x[i:] on the right
+    i, k = np.meshgrid(j, j, indexing='ij')
+    left = k <= i
+    pi = np.maximum(i - k, 0)
+    si = np.maximum(k - i, 0)
+    Y = np.where(left, ys[:, 1, i, pi], ys[:, 0, i, si])
+    D = np.where(left, ds[:, 1, i, pi], ds[:, 0, i, si])
+    # at i, the position with the min dispersion
+    m = j[1:-1]
+    suffix = ds[:, 0, m, 0] < ds[:, 1, m, 0]
+    Y[:, m, m] = np.where(suffix, ys[:, 0, m, 0], ys[:, 1, m, 0])
+    D[:, m, m] = np.where(suffix, ds[:, 0, m, 0], ds[:, 1, m, 0])
+    # the first and the last curves are the moving of x and of x[::-1]
+    Y[:, 0] = ys[:, 0, 0]
+    D[:, 0] = ds[:, 0, 0]
+    Y[:, -1] = ys[:, 1, -1, ::-1]
+    D[:, -1] = ds[:, 1, -1, ::-1]
+
+    mins_index = np.argmin(D, axis=1)[:, None, :]
+    return (np.take_along_axis(Y, mins_index, axis=1)[:, 0],
+            np.take_along_axis(D, mins_index, axis=1)[:, 0])
+
+
 def multimoving(x, f=mean, coeff=2.0):
     """Compute all the moving curves in moving the first point from left to right
        and for each point, select the position which minimize the dispersion.
 
+    With tools.mean, all the curves of all the rows are computed together
+    (see __multimoving_rows) by blocks of rows.
+
     Args:
-        x (list): numbers
+        x (list): numbers (or a 2D array: a series by row)
         f (func): the fonction to compute the position
         coeff (float): a coefficient for the tolerance relative to the disp
 
@@ -190,6 +485,25 @@ def multimoving(x, f=mean, coeff=2.0):
         (numpy.array): the smoothed data
     """
     x = __convert(x)
+    coeff = float(coeff)
+    if f is mean and x.size:
+        rows = x.reshape(-1, x.shape[-1])
+        L = rows.shape[1]
+        # about MULTIMOVING_BLOCK numbers in the curves of a block
+        n = max(1, MULTIMOVING_BLOCK // (2 * L * L))
+        res = [__multimoving_rows(rows[i:(i + n)], coeff)
+               for i in range(0, len(rows), n)]
+        y = np.concatenate([r[0] for r in res]).reshape(x.shape)
+        d = np.concatenate([r[1] for r in res]).reshape(x.shape)
+        return y, d
+
+    if x.ndim == 2:
+        y = np.empty(x.shape)
+        d = np.empty(x.shape)
+        for i, row in enumerate(x):
+            y[i], d[i] = multimoving(row, f=f, coeff=coeff)
+        return y, d
+
     L = len(x)
     ys = np.empty((L, L))
     ds = np.empty((L, L))
@@ -225,9 +539,18 @@ def multimoving(x, f=mean, coeff=2.0):
 
 
 def is_spiking(x, coeff=3., win=7):
+    mx, md = multimoving(x[:-1], coeff=coeff)
+    return get_spike(x, mx, md, coeff=coeff, win=win), mx, md
+
+
+def get_spike(x, mx, md, coeff=3., win=7):
+    """Same as is_spiking with the result of multimoving for x[:-1]
+
+    The moving means don't depend on win, so they can be shared by several
+    windows.
+    """
     last = x[-1]
     y = x[:-1]
-    mx, md = multimoving(y, coeff=coeff)
     m, _ = mean(mx[-win:])
     d, _ = mean(md[-win:])
 
@@ -235,11 +558,11 @@ def is_spiking(x, coeff=3., win=7):
     d = np.ceil(coeff * np.ceil(d))
 
     if last > m + d and last > y[-1]:
-        return 'up', mx, md
+        return 'up'
     elif last < m - d and last < y[-1]:
-        return 'down', mx, md
+        return 'down'
     else:
-        return 'nothing', mx, md
+        return 'nothing'
 
 
 def is_sgn_spiking(numbers, globalstats, coeff,
@@ -277,25 +600,113 @@ def is_sgn_spiking(numbers, globalstats, coeff,
     return None
 
 
-def get_global(stats, coeff, winmin, winmax):
+def are_sgns_spiking(x, globalstats, coeff, winmin, winmax):
+    """Batched version of is_sgn_spiking for all the rows of a matrix
+
+    The means and the standard deviations of the windows are computed for all
+    the rows at once, with the same floating point operations as the scalar
+    version to get the same roundings.
+
+    Args:
+        x (numpy.ndarray): the numbers (a row by signature)
+        globalstats (dict): the stats from get_global
+        coeff (float): the coefficient for the standard deviation
+        winmin (int): the min window
+        winmax (int): the max window
+
+    Returns:
+        numpy.ndarray, numpy.ndarray: for each row the window (0 when the
+                                      signature isn't spiking) and the diff
+    """
+    x = np.asarray(x)
+    R = x.shape[0]
+    wins = np.zeros(R, dtype=np.int64)
+    diffs = np.zeros(R, dtype=np.float64)
+    if R == 0 or not globalstats:
+        return wins, diffs
+
+    last = x[:, -1].astype(np.float64)
+    y = x[:, :-1].astype(np.float64)
+    todo = np.ones(R, dtype=bool)
+    for win in range(winmax, winmin - 1, -1):
+        # the same computations as in is_sgn_spiking: the ceil of the std
+        # depends on its rounding
+        m, e = __get_pd_mean(y[:, -win:], axis=1)
+        m = np.ceil(m)
+        e = np.where(e != 0, np.ceil(e), 1.)
+        diff = last - m
+        out = todo & (diff > coeff * e)
+        if not np.any(out):
+            continue
+        m_r, e_r, m_d, e_d = globalstats[win]
+        zeros = m == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.round(100 * (last / m - 1))
+        hit = out & (zeros | (rate - m_r > e_r) | (last - m - m_d > e_d))
+        wins[hit] = win
+        diffs[hit] = diff[hit]
+        todo &= ~hit
+
+    return wins, diffs
+
+
+def get_global(stats, coeff=3., winmin=7, winmax=11, alpha=0.05):
+    """Get the stats of the ratios and of the diffs of all the signatures
+
+    Args:
+        stats (Counts or dict): the numbers by signature
+        coeff (float): the coefficient for the standard deviation (the stats
+                       don't depend on it)
+        winmin (int): the min window
+        winmax (int): the max window
+        alpha (float): the significance level to remove the outliers
+
+    Returns:
+        dict: window => (mean ratio, ratio error, mean diff, diff error)
+    """
     res = {}
     if len(stats) == 0:
         return res
-    for win in range(winmax, winmin - 1, -1):
-        res[win] = __get_mean_rate(stats, coeff, win)
+    x = __get_matrix(stats)
+    wins = list(range(winmax, winmin - 1, -1))
+    ratios, diffs = zip(*[__get_ratios_diffs(x, win) for win in wins])
+    ratios = np.array(ratios)
+    diffs = np.array(diffs)
+
+    # the outliers for all the windows are computed at once
+    for i, outliers in enumerate(generalized_esd_rows(ratios, 10, alpha)):
+        ratios[i, outliers] = float('NaN')
+    for i, outliers in enumerate(generalized_esd_rows(diffs, 10, alpha)):
+        diffs[i, outliers] = float('NaN')
+
+    for i, win in enumerate(wins):
+        m_r, e_r = __get_pd_mean(ratios[i])
+        m_r = np.round(m_r)
+        e_r = np.round(e_r)
+        m_d, e_d = __get_pd_mean(diffs[i])
+        m_d = np.ceil(m_d)
+        e_d = np.ceil(e_d)
+        res[win] = (m_r, e_r, m_d, e_d)
+
     return res
 
 
-def __get_mean_rate(stats, coeff, win):
-    NaN = float('NaN')
-    R = len(stats)
-    for numbers in stats.values():
-        C = len(numbers)
-        break
-    x = np.empty((R, C))
-    for i, numbers in enumerate(stats.values()):
-        x[i, :] = numbers
+def __get_matrix(stats):
+    """Get the numbers as a float matrix (a row by signature)
+
+    Args:
+        stats (Counts or dict): the numbers by signature
 
+    Returns:
+        numpy.ndarray: the matrix
+    """
+    if hasattr(stats, 'matrix'):
+        return np.asarray(stats.matrix, dtype=np.float64)
+    return np.array(list(stats.values()), dtype=np.float64)
+
+
+def __get_ratios_diffs(x, win):
+    NaN = float('NaN')
     last = x[:, -1]
     y = x[:, -(win + 1):-1]
     means = np.mean(y, axis=1)
@@ -305,19 +716,8 @@ def __get_mean_rate(stats, coeff, win):
     means[zeros] = 1.
     ratios = 100 * (last / means - 1)
     ratios[zeros] = NaN
-    outliers = generalized_esd(ratios, 10)
-    ratios[outliers] = NaN
-    m_r, e_r = __get_pd_mean(ratios)
-    m_r = np.round(m_r)
-    e_r = np.round(e_r)
-
-    outliers = generalized_esd(diffs, 10)
-    diffs[outliers] = NaN
-    m_d, e_d = __get_pd_mean(diffs)
-    m_d = np.ceil(m_d)
-    e_d = np.ceil(e_d)
-
-    return (m_r, e_r, m_d, e_d)
+
+    return ratios, diffs
 
 
 def explosiveness(numbers, nday, win):
@@ -0,0 +1,111 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+from flask import Response, request
+from spikes import db
+
+
+class Generation(db.Model):
+    """The generation of the data: it's bumped each time the data change."""
+
+    __tablename__ = 'generation'
+
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, default=0)
+
+    def __init__(self, value):
+        self.id = 1
+        self.value = value
+
+    def __repr__(self):
+        return '<Generation: {}>'.format(self.value)
+
+    @staticmethod
+    def get():
+        g = db.session.get(Generation, 1)
+        return g.value if g else 0
+
+    @staticmethod
+    def bump():
+        g = db.session.get(Generation, 1)
+        if g:
+            g.value += 1
+        else:
+            db.session.add(Generation(1))
+        db.session.commit()
+
+
+class ResponseCache(object):
+    """In-process cache for the responses of the web pages and of the api.
+
+    A response is cached for a key until the data generation changes.
+    The generation is read from the db for each request (a lookup of a
+    single row by its primary key), so a cached response (or a 304 when
+    the client already has it) is never stale and the data are only
+    queried when they have changed.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.generation = None
+        self.responses = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_generation(self):
+        generation = Generation.get()
+        with self.lock:
+            if generation != self.generation:
+                self.responses.clear()
+                self.generation = generation
+        return generation
+
+    @staticmethod
+    def get_etag(generation, key):
+        key = json.dumps([generation, key], default=str)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key, make):
+        """Get the response for a key
+
+        Args:
+            key (tuple): the key (e.g. (kind, product, channel, date, sgn))
+            make (func): make the response body (str or a flask Response)
+                         when it isn't in the cache
+
+        Returns:
+            flask.Response: the response
+        """
+        generation = self.get_generation()
+        etag = ResponseCache.get_etag(generation, key)
+        if request.if_none_match.contains(etag):
+            res = Response(status=304)
+        else:
+            with self.lock:
+                cached = self.responses.get(key)
+                if cached is not None:
+                    self.responses.move_to_end(key)
+            if cached is None:
+                body = make()
+                if isinstance(body, Response):
+                    cached = (body.get_data(), body.mimetype)
+                else:
+                    cached = (body.encode('utf-8'), 'text/html')
+                with self.lock:
+                    if self.generation == generation:
+                        self.responses[key] = cached
+                        if len(self.responses) > self.maxsize:
+                            self.responses.popitem(last=False)
+            body, mimetype = cached
+            res = Response(body, mimetype=mimetype)
+        res.set_etag(etag)
+        res.headers['Cache-Control'] = 'no-cache'
+
+        return res
+
+
+cache = ResponseCache()
@@ -0,0 +1,114 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+
+class StandInServer(ThreadingHTTPServer):
+    """A local HTTP server standing in for Socorro and Bugzilla.
+
+    It serves /api/SuperSearch/ with the responder (see standin.Recording
+    and standin.Synthetic), and /api/Bugs/ and /rest/bug with the responder
+    get_bugs and get_bug_statuses methods when it has them.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, responder, latency=0., fail=None):
+        super(StandInServer, self).__init__(('127.0.0.1', 0), Handler)
+        self.responder = responder
+        self.latency = latency
+        self.fail = fail
+        self.nrequests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    @property
+    def socorro_url(self):
+        return self.url + '/api'
+
+    @property
+    def bugzilla_url(self):
+        return self.url + '/rest/bug'
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.nrequests += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query, keep_blank_values=True)
+        params = {k: v[0] if len(v) == 1 else v for k, v in params.items()}
+        status = server.fail(url.path, params) if server.fail else None
+        if status == 'close':
+            # the connection is closed without response
+            self.close_connection = True
+            return
+        if status:
+            self.send_error(500 if status is True else status)
+            return
+
+        responder = server.responder
+        if url.path == '/api/SuperSearch/':
+            res = responder(params)
+        elif url.path == '/api/Bugs/' and hasattr(responder, 'get_bugs'):
+            sgns = params.get('signatures', [])
+            if not isinstance(sgns, list):
+                sgns = [sgns]
+            res = responder.get_bugs(sgns)
+        elif url.path == '/rest/bug' and hasattr(responder,
+                                                 'get_bug_statuses'):
+            ids = [int(i) for i in params.get('id', '').split(',') if i]
+            res = responder.get_bug_statuses(ids)
+        else:
+            self.send_error(404)
+            return
+
+        body = json.dumps(res).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve(responder, latency=0., fail=None):
+    """Run a stand-in server in a thread
+
+    Args:
+        responder (func): get the json response from the query params
+        latency (float): the time in seconds to wait for each query
+        fail (func): called with (path, params), a 500 is sent if True
+                     (or the returned status if any) and the connection
+                     is closed without response if 'close'
+
+    Yields:
+        StandInServer: the running server
+    """
+    server = StandInServer(responder, latency=latency, fail=fail)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
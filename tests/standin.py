@@ -0,0 +1,355 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import copy
+import functools
+import gzip
+import json
+import threading
+import time
+import zlib
+from dateutil.relativedelta import relativedelta
+from libmozdata import socorro, utils
+from unittest import mock
+import numpy as np
+
+
+PLATFORMS = ['Windows 10', 'Windows 7', 'OS X 10.15', 'Linux', 'Android 10']
+
+
+def get_key(params):
+    """Get a key identifying a query from its parameters
+
+    The values are normalized as lists of strings in order to have the same
+    key for the params sent by libmozdata and the ones parsed from an url.
+
+    Args:
+        params (dict): the query parameters
+
+    Returns:
+        str: the key
+    """
+    params = {k: [str(x) for x in (v if isinstance(v, list) else [v])]
+              for k, v in params.items()}
+    return json.dumps(params, sort_keys=True)
+
+
+def empty_response():
+    return {'errors': [],
+            'facets': {},
+            'hits': [],
+            'total': 0}
+
+
+class Recording(object):
+    """Responses recorded from Socorro, keyed by the query parameters."""
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+
+    def add(self, params, json):
+        self.responses[get_key(params)] = json
+
+    def __call__(self, params):
+        return self.responses.get(get_key(params), empty_response())
+
+    def __len__(self):
+        return len(self.responses)
+
+    def get_bugs(self, signatures):
+        # only the SuperSearch queries are recorded
+        return {'hits': [], 'total': 0}
+
+    def get_bug_statuses(self, ids):
+        return {'bugs': [], 'faults': []}
+
+    @staticmethod
+    def open(path, mode):
+        # the recordings are gzipped unless they are plain json files
+        return open(path, mode) if path.endswith('.json') else \
+            gzip.open(path, mode)
+
+    def dump(self, path):
+        with Recording.open(path, 'wt') as Out:
+            json.dump(self.responses, Out)
+
+    @staticmethod
+    def load(path):
+        with Recording.open(path, 'rt') as In:
+            return Recording(json.load(In))
+
+
+class Synthetic(object):
+    """Build plausible SuperSearch responses from the query parameters.
+
+    The numbers only depend on the product, the channel, the day and the
+    signature so the same query always gets the same response.
+    """
+
+    def __init__(self, nsgns=1000, seed=0):
+        self.nsgns = nsgns
+        self.seed = seed
+        self.signatures = Synthetic.make_signatures(nsgns)
+        self.responses = {}
+
+    @staticmethod
+    def make_signatures(N):
+        sgns = []
+        for i in range(N):
+            if i % 10 == 9:
+                # make some signatures which only differ by an address
+                sgns.append('foo::bar{} | 0x{:x}'.format(i // 100, i))
+            else:
+                sgns.append('mozilla::Sgn{}::func{}'.format(i // 7, i))
+        return sgns
+
+    def get_counts(self, product, channel, day):
+        s = '{}|{}|{}|{}'.format(self.seed, product, channel, day)
+        rs = np.random.RandomState(zlib.crc32(s.encode('utf-8')))
+        # a Zipf-like distribution for the signatures
+        scale = np.power(np.arange(1, self.nsgns + 1, dtype=np.float64), 0.8)
+        counts = 10000. / scale * rs.uniform(0.5, 1.5, self.nsgns)
+        spikes = rs.randint(0, self.nsgns, max(1, self.nsgns // 100))
+        counts[spikes] *= rs.uniform(2, 10, len(spikes))
+        return counts.astype(np.int64)
+
+    @staticmethod
+    def get_days(params):
+        start, end = None, None
+        for d in params.get('date', []):
+            if d.startswith('>='):
+                start = utils.get_date_ymd(d[2:])
+            elif d.startswith('<'):
+                end = utils.get_date_ymd(d[1:])
+        if end is None:
+            end = utils.get_date_ymd('today') + relativedelta(days=1)
+        days = []
+        while start < end:
+            days.append(start)
+            start += relativedelta(days=1)
+        return days
+
+    @staticmethod
+    def as_list(x):
+        if isinstance(x, list):
+            return x
+        return [x] if x else []
+
+    def get_sgn_facets(self, fields, count, i):
+        facets = {}
+        for field in fields:
+            if field.startswith('_cardinality.'):
+                name = 'cardinality_' + field[len('_cardinality.'):]
+                facets[name] = {'value': int(count * 0.7)}
+            elif field == 'platform_pretty_version':
+                p = PLATFORMS[i % len(PLATFORMS)]
+                q = PLATFORMS[(i + 1) % len(PLATFORMS)]
+                facets[field] = [{'term': p, 'count': count - count // 3},
+                                 {'term': q, 'count': count // 3}]
+            elif field == 'startup_crash':
+                facets[field] = [{'term': 'T', 'count': count // 4},
+                                 {'term': 'F', 'count': count - count // 4}]
+        return facets
+
+    def get_signatures(self, params, product, channel, days, fields):
+        sgns = self.as_list(params.get('signature'))
+        sgns = set(s[1:] for s in sgns if s.startswith('='))
+        size = int(params.get('_facets_size', 50))
+        counts = sum(self.get_counts(product, channel, d) for d in days)
+        order = np.argsort(-counts, kind='stable')
+        res = []
+        for i in order:
+            sgn = self.signatures[i]
+            count = int(counts[i])
+            if count == 0 or (sgns and sgn not in sgns):
+                continue
+            res.append({'term': sgn,
+                        'count': count,
+                        'facets': self.get_sgn_facets(fields, count, i)})
+            if len(res) == size:
+                break
+        return res
+
+    def get_histogram(self, params, product, channels, days, fields):
+        res = []
+        for day in days:
+            counts = {chan: int(self.get_counts(product, chan, day).sum())
+                      for chan in channels}
+            facets = {}
+            for field in fields:
+                if field == 'release_channel':
+                    facets[field] = [{'term': chan, 'count': c}
+                                     for chan, c in counts.items()]
+                elif field.startswith('_cardinality.'):
+                    name = 'cardinality_' + field[len('_cardinality.'):]
+                    value = int(sum(counts.values()) * 0.7)
+                    facets[name] = {'value': value}
+                elif field == 'signature':
+                    # the aggregations on the signatures are nested
+                    aggs = self.as_list(params.get('_aggs.signature'))
+                    facets[field] = self.get_signatures(params, product,
+                                                        channels[0], [day],
+                                                        aggs)
+            res.append({'term': utils.get_date_str(day) + 'T00:00:00+00:00',
+                        'count': sum(counts.values()),
+                        'facets': facets})
+        return res
+
+    def build(self, params):
+        product = params.get('product', 'Firefox')
+        channels = self.as_list(params.get('release_channel')) or ['nightly']
+        days = Synthetic.get_days(params)
+        json = empty_response()
+        aggs = self.as_list(params.get('_aggs.signature'))
+        histo = self.as_list(params.get('_histogram.date'))
+        if histo:
+            json['facets']['histogram_date'] = self.get_histogram(params,
+                                                                  product,
+                                                                  channels,
+                                                                  days,
+                                                                  histo)
+        if aggs or 'signature' in self.as_list(params.get('_facets')):
+            json['facets']['signature'] = self.get_signatures(params,
+                                                              product,
+                                                              channels[0],
+                                                              days,
+                                                              aggs)
+        json['total'] = sum(int(self.get_counts(product, c, d).sum())
+                            for c in channels for d in days)
+        return json
+
+    def get_bugs(self, signatures):
+        hits = []
+        for sgn in signatures:
+            h = zlib.crc32('{}|{}'.format(self.seed, sgn).encode('utf-8'))
+            if h % 3 == 0:
+                hits.append({'id': 1000000 + h % 1000000, 'signature': sgn})
+        return {'hits': hits, 'total': len(hits)}
+
+    def get_bug_statuses(self, ids):
+        bugs = [{'id': i, 'status': 'RESOLVED' if i % 2 else 'NEW'}
+                for i in ids]
+        return {'bugs': bugs, 'faults': []}
+
+    def __call__(self, params):
+        key = get_key(params)
+        if key not in self.responses:
+            self.responses[key] = self.build(params)
+        return self.responses[key]
+
+
+class SuperSearch(object):
+    """A stand-in for libmozdata.socorro.SuperSearch.
+
+    The queries are run in a thread pool like the real one but the
+    responses come from the responder after having waited latency seconds.
+    """
+
+    URL = socorro.SuperSearch.URL
+    WEB_URL = socorro.SuperSearch.WEB_URL
+    MAX_WORKERS = 8
+    responder = staticmethod(Recording())
+    latency = 0.
+    nrequests = 0
+    lock = threading.Lock()
+
+    get_link = staticmethod(socorro.SuperSearch.get_link)
+    get_search_date = staticmethod(socorro.SuperSearch.get_search_date)
+
+    def __init__(self, params=None, handler=None, handlerdata=None,
+                 queries=None, **kwargs):
+        if queries is None:
+            queries = [(params, handler, handlerdata)]
+        else:
+            queries = [(q.params, q.handler, q.handlerdata) for q in queries]
+        self.executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+        self.results = [self.executor.submit(self.run, *q) for q in queries]
+
+    def run(self, params, handler, handlerdata):
+        # the collector may subclass the replayed class (see metrics.metered)
+        cls = next(c for c in type(self).__mro__ if 'nrequests' in vars(c))
+        with self.lock:
+            cls.nrequests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        json = self.responder(params)
+        if handlerdata is not None:
+            handler(json, handlerdata)
+        else:
+            handler(json)
+
+    def wait(self):
+        for r in self.results:
+            r.result()
+        self.executor.shutdown()
+
+
+@contextmanager
+def replay(responder, latency=0.):
+    """Replace socorro.SuperSearch by a stand-in
+
+    Args:
+        responder (func): get the json response from the query params
+        latency (float): the time in seconds to wait for each query
+
+    Yields:
+        the stand-in class (its nrequests attribute counts the queries)
+    """
+    cls = type('SuperSearch', (SuperSearch,),
+               {'responder': staticmethod(responder),
+                'latency': latency,
+                'nrequests': 0,
+                'lock': threading.Lock()})
+    with mock.patch.object(socorro, 'SuperSearch', cls):
+        yield cls
+
+
+# the number of signatures of the synthetic responses in the tests
+NSGNS = 300
+
+
+@functools.lru_cache(maxsize=None)
+def get_synthetic(nsgns=NSGNS):
+    """Get the synthetic responder shared by the tests (its responses only
+    depend on the query parameters)"""
+    return Synthetic(nsgns=nsgns)
+
+
+def replay_synthetic(nsgns=NSGNS, latency=0.):
+    """Same as replay with the shared synthetic responder"""
+    return replay(get_synthetic(nsgns), latency=latency)
+
+
+@contextmanager
+def record(recording):
+    """Record the responses of the real Socorro
+
+    Args:
+        recording (Recording): where to put the responses
+
+    Yields:
+        the recording
+    """
+    real = socorro.SuperSearch
+
+    class Recorder(real):
+
+        def __init__(self, params=None, handler=None, handlerdata=None,
+                     **kwargs):
+            def hdler(json, data=None):
+                recording.add(params, copy.deepcopy(json))
+                if data is not None:
+                    handler(json, data)
+                else:
+                    handler(json)
+
+            super(Recorder, self).__init__(params=params,
+                                           handler=hdler,
+                                           handlerdata=handlerdata,
+                                           **kwargs)
+
+    with mock.patch.object(socorro, 'SuperSearch', Recorder):
+        yield recording
@@ -0,0 +1,181 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import asyncio
+from collections import defaultdict
+import time
+import unittest
+from unittest import mock
+from libmozdata import socorro
+from libmozdata.bugzilla import Bugzilla
+from libmozdata.connection import Connection
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from tests import server, standin
+from spikes import aiocollector as aio
+from spikes.bugcache import BugsCache
+from spikes.metrics import metrics
+from spikes import datacollector as dc
+
+
+def get_engine():
+    # the same in-memory db in the threads of the sessions
+    return create_engine('sqlite://', poolclass=StaticPool,
+                         connect_args={'check_same_thread': False})
+
+
+class AioCollectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.responder = standin.get_synthetic()
+        self.channels = ['nightly', 'beta']
+
+    def run_with_server(self, coro, timeout=Connection.TIMEOUT, **kwargs):
+        with server.serve(self.responder, **kwargs) as s:
+            async def run():
+                async with aio.Session(socorro_url=s.socorro_url,
+                                       bugzilla_url=s.bugzilla_url,
+                                       timeout=timeout) as ses:
+                    return await coro(ses)
+
+            return asyncio.run(run()), s.nrequests
+
+    def test_same_as_threads(self):
+        async def collect(session):
+            return await asyncio.gather(
+                aio.get_sgns_by_install_time(session, self.channels,
+                                             date='2020-03-15', ndays=11),
+                aio.get_by_install_time(session, self.channels,
+                                        date='2020-03-15'),
+                aio.get_total(session, self.channels, date='2020-03-15'))
+
+        res, nrequests = self.run_with_server(collect)
+        self.assertEqual(nrequests, 2 * 12 + 2 + 1)
+
+        with standin.replay(self.responder):
+            expected = [dc.get_sgns_by_install_time(self.channels,
+                                                    date='2020-03-15',
+                                                    ndays=11),
+                        dc.get_by_install_time(self.channels,
+                                               date='2020-03-15'),
+                        dc.get_total(self.channels, date='2020-03-15')]
+        self.assertEqual(list(res), expected)
+
+    def test_retry(self):
+        async def collect(session):
+            return await aio.get_total(session, self.channels,
+                                       date='2020-03-15')
+
+        def get_fail(failure, nfails):
+            failed = defaultdict(int)
+
+            def fail(path, params):
+                # the first queries fail
+                key = standin.get_key(params)
+                failed[key] += 1
+                if failed[key] > nfails:
+                    return False
+                if failure == 'timeout':
+                    time.sleep(0.5)
+                    return False
+                return failure
+            return fail
+
+        # a server error, a closed connection (aiohttp already sends the
+        # query again once on a disconnection) and a timeout
+        for failure, nfails in [(True, 1), ('close', 2), ('timeout', 1)]:
+            metrics.reset()
+            res, nrequests = self.run_with_server(collect, timeout=0.25,
+                                                  fail=get_fail(failure,
+                                                                nfails))
+            self.assertEqual(nrequests, nfails + 1)
+            self.assertEqual(set(res.keys()), set(self.channels))
+            s = metrics.to_dict()['socorro.SuperSearch']
+            self.assertEqual((s['count'], s['retries']), (1, 1))
+            self.assertGreater(s['size'], 0)
+
+    def test_get_sgns_info(self):
+        sgns = self.responder.signatures[:200]
+        sgns_by_chan = {chan: sgns for chan in self.channels}
+        bad = sgns[7]
+
+        def fail(path, params):
+            # a query with the bad signature gets a bad request
+            return 400 if '=' + bad in params['signature'] else False
+
+        async def collect(session):
+            return await aio.get_sgns_info(session, sgns_by_chan,
+                                           date='2020-03-15')
+
+        res, nrequests = self.run_with_server(collect)
+        # the chunks are larger than 10 signatures
+        self.assertLess(nrequests, 2 * 200 // 10)
+        self.assertEqual(res[self.channels[0]].keys(), set(sgns))
+        with standin.replay(self.responder):
+            expected = dc.get_sgns_info(sgns_by_chan, date='2020-03-15')
+        self.assertEqual(res, expected)
+
+        failed, n = self.run_with_server(collect, fail=fail)
+        # the chunk with the bad signature is split until it's alone: at
+        # most 2 queries for each of the 7 halvings of 100 signatures
+        self.assertGreater(n, nrequests)
+        self.assertLessEqual(n, nrequests + 2 * 2 * 7)
+        for chan in self.channels:
+            del res[chan][bad]
+        self.assertEqual(failed, res)
+
+    def test_get_bugs(self):
+        sgns = self.responder.signatures[:50]
+
+        async def collect(session):
+            return await aio.get_bugs(session, sgns)
+
+        res, _ = self.run_with_server(collect)
+        self.assertEqual(set(res.keys()), set(sgns))
+        bugs = self.responder.get_bugs(sgns)['hits']
+        self.assertTrue(bugs)
+        for hit in bugs:
+            info = res[hit['signature']]
+            if hit['id'] % 2:
+                self.assertEqual(info['resolved'][0], str(hit['id']))
+            else:
+                self.assertEqual(info['unresolved'][0], str(hit['id']))
+
+        # the same bugs as the sync path
+        with server.serve(self.responder) as s, \
+            mock.patch.object(socorro.Bugs, 'URL', s.socorro_url + '/Bugs/'), \
+            mock.patch.object(Bugzilla, 'API_URL', s.bugzilla_url), \
+                mock.patch.object(Connection, 'USER_AGENT', 'spikes'):
+            self.assertEqual(dc.get_bugs(sgns), res)
+
+    def test_get_bugs_cache(self):
+        sgns = self.responder.signatures[:50]
+        cache = BugsCache(engine=get_engine())
+
+        async def collect(session):
+            return await aio.get_bugs(session, sgns, cache=cache)
+
+        nbugs = len({hit['id'] for hit in
+                     self.responder.get_bugs(sgns)['hits']})
+        res, nrequests = self.run_with_server(collect)
+        self.assertEqual(nrequests, 5 + 1)
+        self.assertEqual(cache.stats, {'signatures': [50, 0],
+                                       'bugs': [nbugs, 0]})
+
+        cached, nrequests = self.run_with_server(collect)
+        self.assertEqual(nrequests, 0)
+        self.assertEqual(cached, res)
+        self.assertEqual(cache.stats, {'signatures': [100, 50],
+                                       'bugs': [2 * nbugs, nbugs]})
+
+        # the entries are expired as soon as they're put
+        cache = BugsCache(ttl=-1, engine=get_engine())
+        for _ in range(2):
+            cached, nrequests = self.run_with_server(collect)
+            self.assertEqual(nrequests, 5 + 1)
+            self.assertEqual(cached, res)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import tempfile
+import unittest
+from tests import standin
+from spikes import backtest, replay
+
+
+class BacktestTest(unittest.TestCase):
+
+    def test_get_stats(self):
+        alerts = [{'a', 'b'}, {'b', 'c'}, set(), set()]
+        stats = backtest.get_stats(alerts)
+        self.assertEqual(stats['alerts'], [2, 2, 0, 0])
+        self.assertEqual(stats['mean'], 1.)
+        self.assertAlmostEqual(stats['stability'], (1. / 3. + 0. + 1.) / 3.)
+
+    def test_backtest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.npz')
+            with standin.replay_synthetic():
+                replay.dump(path, '2020-03-14', end='2020-03-15')
+            res = backtest.backtest(path, coeffs=[3., 4.], wins=[5, 7],
+                                    alphas=[0.01, 0.05], processes=1)
+            expected = replay.replay(replay.load(path))
+
+        self.assertEqual(res['dates'], ['2020-03-14', '2020-03-15'])
+        self.assertEqual(len(res['results']), 2 * 8)
+        results = {(r['detector'], r['coeff'], r['win'], r['alpha']):
+                   r['alerts'] for r in res['results']}
+        self.assertEqual(results[('signatures', 3., 7, 0.05)],
+                         [replay.count(s) for _, s, _ in expected])
+        self.assertEqual(results[('startup', 4., 5, 0.01)],
+                         [replay.count(o) for _, _, o in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
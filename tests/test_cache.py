@@ -0,0 +1,40 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import datetime
+import unittest
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import create_engine
+from spikes import app, db
+from spikes.cache import CountsCache, DBCountsCache
+
+
+class CacheTest(unittest.TestCase):
+
+    def test_prune(self):
+        last = datetime.date(2020, 3, 15)
+        days = [last - relativedelta(days=i) for i in range(20)]
+        buckets = {day: {'foo': i} for i, day in enumerate(days)}
+        for cache in [CountsCache(mutable_days=2),
+                      DBCountsCache(mutable_days=2,
+                                    engine=create_engine('sqlite://'))]:
+            for chan in ['nightly', 'beta']:
+                cache.put('Firefox', chan, 'key', buckets)
+            self.assertEqual(cache.prune(last, 13), 2 * 6)
+            self.assertEqual(cache.prune(last, 13), 0)
+            for chan in ['nightly', 'beta']:
+                res = cache.get('Firefox', chan, 'key', days)
+                self.assertEqual(sorted(res), days[:14][::-1])
+                self.assertEqual(res[days[13]], {'foo': 13})
+
+    def test_engine(self):
+        # the db is only used in an app context
+        with self.assertRaises(RuntimeError):
+            DBCountsCache()
+        with app.app_context():
+            self.assertIs(DBCountsCache().engine, db.engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import re
+import unittest
+from spikes import config
+
+
+class ConfigTest(unittest.TestCase):
+
+    def test_skipper(self):
+        sgns = ['IPCError-browser | ShutDownKill',
+                'IPCError-browser | ShutDownKill | foo',
+                'OOM | small',
+                'OOM | large | foo',
+                'abab',
+                'abba',
+                'foo::bar',
+                '']
+        skiplists = [['^IPCError-browser \\| ShutDownKill$', '^OOM \\| sm'],
+                     ['(a)(b)\\2\\1', 'foo'],
+                     ['(?i)^oom', 'bar'],
+                     ['(?P<x>a)b', '(?P<x>f)oo'],
+                     []]
+        for skiplist in skiplists:
+            patterns = [re.compile(p) for p in skiplist]
+            skipper = config.Skipper(patterns)
+            for sgn in sgns + sgns:
+                self.assertEqual(skipper(sgn),
+                                 any(p.match(sgn) for p in patterns))
+
+            # the other ones can't be put in a single alternation
+            self.assertEqual(skipper.regex is not None,
+                             skiplist is skiplists[0])
+        skipper = config.get_skipper('nightly')
+        self.assertIs(skipper, config.get_skipper('nightly'))
+        self.assertTrue(skipper('IPCError-browser | ShutDownKill'))
+        self.assertFalse(skipper('foo'))
+
+
+if __name__ == '__main__':
+    unittest.main()
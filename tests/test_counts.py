@@ -0,0 +1,40 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+from spikes.counts import Counts
+from spikes.gather import gather
+
+
+class CountsTest(unittest.TestCase):
+
+    def test_set_day(self):
+        c = Counts(['d1', 'd2', 'd3'], capacity=1)
+        c.set_day('d1', {'a': 1, 'b': 2})
+        c.set_day('d3', {'b': 5, 'c': 7, 'skipped': 3},
+                  skip=lambda s: s == 'skipped')
+        self.assertEqual(c.keys(), ['a', 'b', 'c'])
+        self.assertEqual(dict(c.items()), {'a': [1, 0, 0],
+                                           'b': [2, 0, 5],
+                                           'c': [0, 0, 7]})
+        self.assertEqual(c.matrix.shape, (3, 3))
+
+    def test_gather_take(self):
+        c = Counts(['d1', 'd2'])
+        c.set_day('d1', {'foo | 0x12': 1, 'bar': 2, 'foo | 0xab': 3})
+        c.set_day('d2', {'foo | 0x12': 4, 'baz': 8})
+        gather(c)
+        key = '"foo | "0x[0-9a-fA-F]+""'
+        self.assertEqual(c.keys(), ['bar', 'baz', key])
+        self.assertEqual(c[key], [4, 4])
+        self.assertEqual(c.members, {key: ['foo | 0x12', 'foo | 0xab']})
+        t = c.take([2, 0])
+        self.assertEqual(t.keys(), [key, 'bar'])
+        self.assertEqual(t.values(), [[4, 4], [2, 0]])
+        self.assertEqual(t.members, c.members)
+        self.assertEqual(c.take([0]).members, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import numpy as np
 import unittest
+from unittest import mock
+from sqlalchemy import create_engine, func, select
+from tests import standin
+from spikes.bugcache import BugsCache, SignatureBugs
 from spikes import datacollector as dc
+from spikes.cache import CountsCache
+from spikes.counts import Counts
 
 
 class DataCollectorTest(unittest.TestCase):
@@ -38,6 +45,179 @@ class DataCollectorTest(unittest.TestCase):
         self.assertEqual(outliers, {'sgn::foo4',
                                     'sgn::foo5'})
 
+    def test_get_sgns_by_install_time_concurrent(self):
+        channels = ['nightly', 'beta']
+        with standin.replay_synthetic():
+            serial, _ = dc.get_sgns_by_install_time(channels,
+                                                    date='2020-03-15',
+                                                    ndays=11,
+                                                    workers=1)
+        with standin.replay_synthetic() as cls:
+            concurrent, _ = dc.get_sgns_by_install_time(channels,
+                                                        date='2020-03-15',
+                                                        ndays=11,
+                                                        workers=8)
+            self.assertEqual(cls.nrequests, 2 * 12)
+        self.assertEqual(serial, concurrent)
+        self.assertEqual(len(concurrent['nightly']), 50)
+
+    def test_get_sgns_by_install_time_cache(self):
+        channels = ['nightly', 'beta']
+        cache = CountsCache(mutable_days=2)
+        for date, nqueries in [('2020-03-15', 2 * 12),
+                               ('2020-03-15', 0),
+                               ('2020-03-16', 2),
+                               ('today', 2 * 12),
+                               ('today', 2 * 2)]:
+            with standin.replay_synthetic() as cls:
+                data, _ = dc.get_sgns_by_install_time(channels,
+                                                      date=date,
+                                                      ndays=11,
+                                                      cache=cache)
+                self.assertEqual(cls.nrequests, nqueries)
+            with standin.replay_synthetic():
+                expected, _ = dc.get_sgns_by_install_time(channels,
+                                                          date=date,
+                                                          ndays=11)
+            self.assertEqual(data, expected)
+
+    def test_get_by_install_time_cache(self):
+        channels = ['nightly', 'beta']
+        cache = CountsCache(mutable_days=2)
+        for date, nqueries in [('2020-03-15', 2),
+                               ('2020-03-15', 0),
+                               ('2020-03-16', 2),
+                               ('today', 2),
+                               ('today', 2)]:
+            with standin.replay_synthetic() as cls:
+                data = dc.get_by_install_time(channels, date=date,
+                                              cache=cache)
+                self.assertEqual(cls.nrequests, nqueries)
+            with standin.replay_synthetic():
+                expected = dc.get_by_install_time(channels, date=date)
+            self.assertEqual(data, expected)
+            self.assertEqual(len(data['nightly']), 25 * 7 + 1)
+
+    def test_batch(self):
+        channels = ['nightly', 'beta']
+        plan = dc.batch(
+            dc.get_total.plan(channels, date='2020-03-15'),
+            dc.get_total.plan(channels, date='2020-03-15'),
+            dc.get_by_install_time.plan(channels, date='2020-03-15'))
+        with standin.replay_synthetic() as cls, \
+            mock.patch.object(dc, 'run_searches',
+                              wraps=dc.run_searches) as run_searches:
+            res = dc.run_plan(plan)
+            # a single round: the identical totals searches are sent once
+            # and the histograms searches (one by channel) aren't merged
+            self.assertEqual(run_searches.call_count, 1)
+            self.assertEqual(cls.nrequests, 1 + 2)
+        with standin.replay_synthetic():
+            total = dc.get_total(channels, date='2020-03-15')
+            data = dc.get_by_install_time(channels, date='2020-03-15')
+        self.assertEqual(res, (total, total, data))
+
+    def test_dedupe_searches(self):
+        calls = []
+
+        def handler(json, data):
+            calls.append(data)
+
+        params = {'product': 'Firefox', '_facets': ['signature']}
+        other = dict(params, _facets=['install_time'])
+        searches = dc.dedupe_searches([(params, handler, 1),
+                                       (dict(params), handler, 2),
+                                       (other, handler, 3)])
+        # only the exact duplicates are merged
+        self.assertEqual([s[0] for s in searches], [params, other])
+        for params, hdler, data in searches:
+            hdler({}, data)
+        self.assertEqual(calls, [1, 2, 3])
+
+    def test_get_sgns_by_install_time_range(self):
+        channels = ['nightly', 'beta']
+        dates = ['2020-03-13', '2020-03-14', '2020-03-15']
+        with standin.replay_synthetic() as cls:
+            res = dc.get_sgns_by_install_time_range(channels, dates,
+                                                    ndays=11)
+            # each day is queried once
+            self.assertEqual(cls.nrequests, 2 * 14)
+        for date, data in zip(dates, res):
+            with standin.replay_synthetic():
+                expected, _ = dc.get_sgns_by_install_time(channels,
+                                                          date=date,
+                                                          ndays=11)
+            self.assertEqual(data, expected)
+
+    def test_get_bugs_cache(self):
+        responder = standin.get_synthetic()
+        calls = []
+
+        def query_bugs(kind, keys):
+            calls.append((kind, len(keys)))
+            if kind == 'bugs':
+                return {bug['id']: bug['status'] for bug in
+                        responder.get_bug_statuses(keys)['bugs']}
+            res = {s: [] for s in keys}
+            for hit in responder.get_bugs(keys)['hits']:
+                res[hit['signature']].append(hit['id'])
+            return res
+
+        def run(sgns, cache):
+            del calls[:]
+            with mock.patch.object(dc, 'query_bugs', query_bugs):
+                return dc.get_bugs(sgns, cache=cache)
+
+        sgns = responder.signatures[:50]
+        nbugs = len({hit['id'] for hit in responder.get_bugs(sgns)['hits']})
+        expected = run(sgns, None)
+        self.assertEqual(calls, [('signatures', 50), ('bugs', nbugs)])
+
+        engine = create_engine('sqlite://')
+        cache = BugsCache(engine=engine)
+        self.assertEqual(run(sgns, cache), expected)
+        self.assertEqual(calls, [('signatures', 50), ('bugs', nbugs)])
+        self.assertEqual(cache.stats, {'signatures': [50, 0],
+                                       'bugs': [nbugs, 0]})
+
+        # all the signatures and bugs are in the cache
+        self.assertEqual(run(sgns, cache), expected)
+        self.assertEqual(calls, [])
+        self.assertEqual(cache.stats, {'signatures': [100, 50],
+                                       'bugs': [2 * nbugs, nbugs]})
+
+        # the missing signatures are queried
+        more = responder.signatures[:60]
+        run(more, cache)
+        self.assertEqual(calls[0], ('signatures', 10))
+
+        # the expired entries are queried and the ones which aren't queried
+        # anymore are removed
+        engine = create_engine('sqlite://')
+        cache = BugsCache(ttl=-1, engine=engine)
+        for _ in range(2):
+            self.assertEqual(run(sgns, cache), expected)
+            self.assertEqual(calls, [('signatures', 50), ('bugs', nbugs)])
+        run(responder.signatures[100:110], cache)
+        with engine.connect() as conn:
+            q = select(func.count()).select_from(SignatureBugs.__table__)
+            self.assertEqual(conn.execute(q).scalar(), 10)
+
+    def test_get_top_signatures(self):
+        rs = np.random.RandomState(0)
+        for n in [0, 10, 1000]:
+            x = rs.randint(0, 20, (n, 3))
+            data = Counts.from_rows([1, 2, 3], range(n), x)
+            rows = np.flatnonzero(x[:, -1] >= 4)
+            top = dc.get_top_signatures(data, 'Firefox', 'nightly', N=0)
+            self.assertEqual(top.keys(), rows.tolist())
+
+            # sorted by number for the last day, the ties by row
+            rows = rows[np.argsort(-x[rows, -1], kind='stable')]
+            for N in [1, 5, 50, 2000]:
+                top = dc.get_top_signatures(data, 'Firefox', 'nightly', N=N)
+                self.assertEqual(top.keys(), rows[:N].tolist())
+
 
 if __name__ == '__main__':
     unittest.main()
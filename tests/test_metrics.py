@@ -0,0 +1,91 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from collections import defaultdict
+import unittest
+from unittest import mock
+from libmozdata import socorro
+from libmozdata.bugzilla import Bugzilla
+from libmozdata.connection import Connection
+from tests import server, standin
+from spikes import app, db
+from spikes import datacollector as dc
+from spikes.metrics import get_nfacets, metrics, Metrics, Run
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_get_nfacets(self):
+        json = {'facets': {'histogram_date': [
+            {'term': 'd1', 'facets': {'signature': [{'term': 'a'},
+                                                    {'term': 'b'}]}},
+            {'term': 'd2', 'facets': {'signature': [{'term': 'a'}]}}],
+            'cardinality_install_time': {'value': 3}}}
+        self.assertEqual(get_nfacets(json), 5)
+        self.assertEqual(get_nfacets({'hits': []}), 0)
+
+    def test_metrics(self):
+        m = Metrics()
+        m.add('foo', 2., size=10, facets=3, retries=1)
+        with m.timer('foo'):
+            pass
+        s = m.to_dict()['foo']
+        self.assertEqual(s['count'], 2)
+        self.assertEqual(s['max_time'], 2.)
+        self.assertEqual((s['size'], s['facets'], s['retries']), (10, 3, 1))
+
+        metrics.reset()
+        with standin.replay_synthetic():
+            dc.get_sgns_by_install_time(['nightly'], date='2020-03-15',
+                                        ndays=3)
+        s = metrics.to_dict()
+        self.assertEqual(s['socorro.SuperSearch']['count'], 4)
+        self.assertGreater(s['socorro.SuperSearch']['facets'], 0)
+        self.assertEqual(s['stats']['count'], 1)
+
+    def test_sync_payload(self):
+        responder = standin.get_synthetic()
+        failed = defaultdict(int)
+
+        def fail(path, params):
+            # the first SuperSearch query fails
+            failed[path] += 1
+            return path == '/api/SuperSearch/' and failed[path] == 1
+
+        metrics.reset()
+        with server.serve(responder, fail=fail) as s, \
+            mock.patch.object(socorro.Socorro, 'CRASH_STATS_URL', s.url), \
+            mock.patch.object(socorro.SuperSearch, 'URL',
+                              s.socorro_url + '/SuperSearch/'), \
+            mock.patch.object(socorro.Bugs, 'URL', s.socorro_url + '/Bugs/'), \
+            mock.patch.object(Bugzilla, 'API_URL', s.bugzilla_url), \
+                mock.patch.object(Connection, 'USER_AGENT', 'spikes'):
+            dc.get_total(['nightly'], date='2020-03-15')
+            dc.get_bugs(responder.signatures[:20])
+
+        stats = metrics.to_dict()
+        s = stats['socorro.SuperSearch']
+        self.assertEqual((s['count'], s['retries']), (1, 1))
+        self.assertGreater(s['size'], 0)
+        for name in ['socorro.Bugs', 'bugzilla']:
+            self.assertEqual(stats[name]['count'], 1)
+            self.assertGreater(stats[name]['size'], 0)
+            self.assertEqual(stats[name]['retries'], 0)
+
+    def test_run_put(self):
+        with app.app_context():
+            Run.__table__.create(db.engine, checkfirst=True)
+            db.session.query(Run).delete()
+            m = Metrics()
+            for i in range(5):
+                m.add('foo', float(i))
+                self.assertEqual(Run.put(m, float(i), keep=3),
+                                 0 if i < 3 else 1)
+            runs = Run.get_last(10)
+            self.assertEqual([r['duration'] for r in runs], [4., 3., 2.])
+            self.assertEqual(runs[0]['metrics']['foo']['count'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
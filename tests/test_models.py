@@ -0,0 +1,116 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import datetime
+import unittest
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql
+from spikes import app, db
+from spikes.counts import Counts
+from spikes.models import Signatures, migrate
+
+
+def has_postgresql():
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    return uri.startswith('postgresql')
+
+
+class ModelsTest(unittest.TestCase):
+
+    def test_upsert(self):
+        bug = {'resolved': (12, 'RESOLVED'), 'unresolved': None}
+        row = Signatures.get_row('FiN', '60.0a1', datetime.date(2018, 1, 3),
+                                 'foo', [1] * 11, bug)
+        self.assertEqual(row['bug_c'], 12)
+        self.assertEqual(row['bug_o'], 0)
+
+        q = Signatures.get_upsert([row])
+        q = str(q.compile(dialect=postgresql.dialect()))
+        self.assertIn('ON CONFLICT (pc, date, signature) DO UPDATE', q)
+        self.assertIn('IS DISTINCT FROM excluded.numbers', q)
+        self.assertNotIn('version = excluded.version', q)
+        self.assertIn('RETURNING xmax', q)
+
+    @unittest.skipUnless(has_postgresql(), 'needs a PostgreSQL DATABASE_URL')
+    def test_put_data(self):
+        date = datetime.date(2000, 1, 3)
+        sgns = ['a', 'b', 'c', 'd']
+        bugs = {s: {'resolved': None, 'unresolved': None} for s in sgns}
+        bugs['b']['unresolved'] = (123, 'NEW')
+        data = {'Firefox': {'nightly': {'a': [1] * 11, 'b': [2] * 11},
+                            'beta': {'c': [3] * 11}}}
+
+        def get_rows():
+            qs = db.session.query(Signatures).filter_by(date=date)
+            return {(q.pc, q.signature): (q.numbers, q.bug_o) for q in qs}
+
+        with app.app_context():
+            db.create_all()
+            migrate(db.engine)
+            db.session.query(Signatures).filter_by(date=date).delete()
+            db.session.commit()
+            try:
+                stats = Signatures.put_data(data, bugs, date, {})
+                self.assertEqual(stats, {'inserted': 3, 'updated': 0,
+                                         'deleted': 0})
+                self.assertEqual(get_rows(),
+                                 {('FiN', 'a'): ([1] * 11, 0),
+                                  ('FiN', 'b'): ([2] * 11, 123),
+                                  ('FiB', 'c'): ([3] * 11, 0)})
+
+                # the same data: nothing is written
+                stats = Signatures.put_data(data, bugs, date, {})
+                self.assertEqual(stats, {'inserted': 0, 'updated': 0,
+                                         'deleted': 0})
+
+                # nightly: a is updated, b is deleted and d is inserted
+                # beta isn't in the data so its rows are kept
+                data = {'Firefox': {'nightly': {'a': [5] * 11,
+                                                'd': [4] * 11}}}
+                stats = Signatures.put_data(data, bugs, date, {})
+                self.assertEqual(stats, {'inserted': 1, 'updated': 1,
+                                         'deleted': 1})
+                self.assertEqual(get_rows(),
+                                 {('FiN', 'a'): ([5] * 11, 0),
+                                  ('FiN', 'd'): ([4] * 11, 0),
+                                  ('FiB', 'c'): ([3] * 11, 0)})
+
+                # an empty channel: all its rows are deleted
+                data = {'Firefox': {'beta': {}}}
+                stats = Signatures.put_data(data, bugs, date, {})
+                self.assertEqual(stats, {'inserted': 0, 'updated': 0,
+                                         'deleted': 1})
+
+                # the signatures gathered in a merged one are stored
+                members = {'d': ['d | 0x12', 'd | 0xab']}
+                counts = Counts.from_rows(list(range(11)), ['a', 'd'],
+                                          [[5] * 11, [4] * 11],
+                                          members=members)
+                data = {'Firefox': {'nightly': counts}}
+                stats = Signatures.put_data(data, bugs, date, {})
+                self.assertEqual(stats, {'inserted': 0, 'updated': 1,
+                                         'deleted': 0})
+                res = Signatures.get('Firefox', 'nightly', date)
+                res = {s: i['members'] for s, i in res['signatures'].items()}
+                self.assertEqual(res, {'a': [], 'd': members['d']})
+            finally:
+                db.session.rollback()
+                db.session.query(Signatures).filter_by(date=date).delete()
+                db.session.commit()
+
+    @unittest.skipUnless(has_postgresql(), 'needs a PostgreSQL DATABASE_URL')
+    def test_migrate(self):
+        with app.app_context():
+            db.create_all()
+            engine = db.engine
+            with engine.begin() as conn:
+                conn.execute(text('ALTER TABLE signatures '
+                                  'DROP COLUMN IF EXISTS members'))
+            migrate(engine)
+            columns = inspect(engine).get_columns('signatures')
+            self.assertIn('members', {c['name'] for c in columns})
+
+
+if __name__ == '__main__':
+    unittest.main()
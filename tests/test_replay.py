@@ -0,0 +1,58 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from tests import standin
+from spikes import app, startup
+from spikes import datacollector as dc
+from spikes import replay
+from spikes import utils as sputils
+
+
+class ReplayTest(unittest.TestCase):
+
+    def test_replay(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.npz')
+            with standin.replay_synthetic():
+                replay.dump(path, '2020-03-14', end='2020-03-15')
+            with standin.replay_synthetic() as cls:
+                res = replay.replay(replay.load(path))
+                self.assertEqual(cls.nrequests, 0)
+
+        self.assertEqual(len(res), 2)
+        with standin.replay_synthetic():
+            for date, spikes, _ in res:
+                expected = {}
+                for product in sputils.get_products():
+                    data, _ = dc.get_sgns_by_install_time(
+                        sputils.get_channels(), product=product,
+                        date=date, ndays=11)
+                    s = dc.get_spiking_signatures(data, 3., 7, 11)
+                    if s:
+                        expected[product] = s
+                self.assertEqual(spikes, expected)
+
+    def test_startup_outliers(self):
+        date = '2020-03-15'
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.npz')
+            with standin.replay_synthetic():
+                replay.dump(path, date, end=date)
+            data = replay.load(path)
+
+        outliers = replay.get_startup_outliers(data, data['dates'][0])
+        with standin.replay_synthetic(), \
+            mock.patch.object(dc, 'query_bugs', lambda kind, keys: {}), \
+                app.app_context():
+            significants, _, _ = startup.get(date=date)
+        self.assertTrue(significants)
+        self.assertEqual(outliers, significants)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+from sqlalchemy import create_engine
+from spikes.schedule import get_interval, update_lock
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def test_get_interval(self):
+        self.assertEqual(get_interval(5., True, 1200., 600., 3600.), 600.)
+        self.assertEqual(get_interval(5., False, None, 600., 3600.), 600.)
+        self.assertEqual(get_interval(5., False, 600., 600., 3600.), 1200.)
+        self.assertEqual(get_interval(5., False, 2400., 600., 3600.), 3600.)
+        # never shorter than the last run
+        self.assertEqual(get_interval(900., True, 600., 600., 3600.), 900.)
+
+    def test_update_lock(self):
+        with update_lock(create_engine('sqlite://')) as locked:
+            self.assertTrue(locked)
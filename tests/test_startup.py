@@ -0,0 +1,90 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+from libmozdata import socorro
+from libmozdata.bugzilla import Bugzilla
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from tests import server, standin
+from spikes import app, startup
+from spikes.bugcache import BugsCache
+from spikes.cache import DBCountsCache
+from spikes import datacollector as dc
+
+
+class StartupTest(unittest.TestCase):
+
+    def aget(self, latency, deadline, **kwargs):
+        responder = standin.get_synthetic()
+        with server.serve(responder, latency=latency) as s, \
+            mock.patch.object(socorro.Socorro, 'API_URL', s.socorro_url), \
+            mock.patch.object(Bugzilla, 'API_URL', s.bugzilla_url), \
+                app.app_context():
+            start = time.perf_counter()
+            res = asyncio.run(startup.aget(date='2020-03-15',
+                                           deadline=deadline, **kwargs))
+            self.nrequests = s.nrequests
+            return res, time.perf_counter() - start
+
+    def test_same_as_aget(self):
+        (significants, _, totals), _ = self.aget(0., 0)
+        with standin.replay_synthetic(), \
+            mock.patch.object(dc, 'query_bugs', lambda kind, keys: {}), \
+            mock.patch.object(dc, 'run_searches',
+                              wraps=dc.run_searches) as run_searches, \
+                app.app_context():
+            res = startup.get(date='2020-03-15')
+            # the histograms and then the totals and the signatures
+            self.assertEqual(run_searches.call_count, 2)
+        self.assertEqual(res[0], significants)
+        self.assertEqual(res[2], totals)
+
+    def test_caches(self):
+        # the same in-memory db in all the threads
+        engine = create_engine('sqlite://', poolclass=StaticPool,
+                               connect_args={'check_same_thread': False})
+        threads = set()
+
+        class CountsCache(DBCountsCache):
+            # the db is used out of the loop
+            def get(self, *args):
+                threads.add(threading.current_thread())
+                return super(CountsCache, self).get(*args)
+
+            def put(self, *args):
+                threads.add(threading.current_thread())
+                return super(CountsCache, self).put(*args)
+
+        cache = CountsCache(mutable_days=0, engine=engine)
+        bugs_cache = BugsCache(engine=engine)
+        res, _ = self.aget(0., 0)
+        nrequests = self.nrequests
+        for _ in range(2):
+            cached, _ = self.aget(0., 0, cache=cache, bugs_cache=bugs_cache)
+            self.assertEqual(cached, res)
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertTrue(threads)
+        # the histograms and the bugs come from the caches the second time
+        self.assertLess(self.nrequests, nrequests)
+        self.assertEqual(bugs_cache.stats['signatures'][1],
+                         len(res[1]))
+
+    def test_deadline(self):
+        (significants, bugs, totals), _ = self.aget(0., 0)
+        self.assertTrue(significants)
+        self.assertEqual(set(totals), set(significants))
+
+        # the products are skipped when the deadline is reached
+        (significants, bugs, totals), duration = self.aget(1., 0.5)
+        self.assertLess(duration, 1.)
+        self.assertEqual((significants, bugs, totals), ({}, {}, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import numpy as np
+import unittest
+from spikes import tools
+
+
+def get_numbers(R, C, seed=0):
+    rs = np.random.RandomState(seed)
+    base = rs.zipf(1.5, size=R).clip(0, 10000)
+    x = rs.poisson(base[:, None] * rs.uniform(0.5, 1.5, (R, C)))
+    x[rs.randint(0, R, R // 100), -1] *= 5
+    small = rs.randint(0, R, R // 10)
+    x[small] = rs.randint(0, 4, (len(small), C))
+    return x.astype(np.int32)
+
+
+class ToolsTest(unittest.TestCase):
+
+    def test_are_sgns_spiking(self):
+        for seed in range(3):
+            x = get_numbers(2000, 12, seed=seed)
+            stats = {i: numbers for i, numbers in enumerate(x.tolist())}
+            globalstats = tools.get_global(stats, 3., 7, 11)
+            wins, diffs = tools.are_sgns_spiking(x, globalstats, 3., 7, 11)
+            self.assertTrue(np.any(wins))
+            for i, numbers in enumerate(x):
+                res = tools.is_sgn_spiking(numbers, globalstats, 3., 7, 11)
+                if res is None:
+                    self.assertEqual(wins[i], 0)
+                else:
+                    self.assertEqual((wins[i], diffs[i]), res)
+
+    def test_are_sgns_spiking_boundary(self):
+        # the std of the window is 50 but np.nanstd gives 50.00000000000001
+        # so its ceil is 51: the last number is spiking only with 50
+        window = [399, 424, 349, 349, 324, 449, 299, 424, 424]
+        x = get_numbers(200, 10)
+        x[0] = window + [383 + 3 * 50 + 1]
+        stats = {i: numbers for i, numbers in enumerate(x.tolist())}
+        globalstats = tools.get_global(stats, 3., 9, 9)
+        wins, diffs = tools.are_sgns_spiking(x, globalstats, 3., 9, 9)
+        res = tools.is_sgn_spiking(x[0], globalstats, 3., 9, 9)
+        self.assertIsNone(res)
+        self.assertEqual(wins[0], 0)
+
+    def test_generalized_esd(self):
+        x = np.array([3., 4., 3., 5., 4., 3., 4., 50., 3., 4., -30., 4.])
+        self.assertEqual(tools.generalized_esd(x, 3), [7, 10])
+        x[[0, 5]] = float('NaN')
+        self.assertEqual(tools.generalized_esd(x, 3), [7, 10])
+        self.assertEqual(tools.generalized_esd(np.full(10, 2.), 3), [])
+
+        rs = np.random.RandomState(0)
+        x = np.concatenate([rs.normal(0, 1, (10, 100)),
+                            rs.randint(0, 4, (10, 100)),
+                            rs.poisson(10, (10, 100)) * 1.])
+        x[rs.randint(0, 30, 40), rs.randint(0, 100, 40)] = float('NaN')
+        x[rs.randint(0, 30, 20), rs.randint(0, 100, 20)] *= 30
+        for alpha in [0.05, 0.01]:
+            outliers = tools.generalized_esd_rows(x, 10, alpha=alpha)
+            for row, out in zip(x, outliers):
+                self.assertEqual(out, tools.generalized_esd(row, 10,
+                                                            alpha=alpha))
+
+    def test_multimoving(self):
+        rs = np.random.RandomState(0)
+
+        # a function which isn't tools.mean uses the generic (slow) way
+        def mean(x):
+            return tools.mean(x)
+
+        for L in [1, 2, 7, 12, 60, 175]:
+            x = rs.poisson(rs.uniform(1, 1000), L).astype(np.float64)
+            x[rs.randint(0, L, 3)] *= 4
+            for coeff in [2., 3., 4.]:
+                y1, d1 = tools.multimoving(x, f=mean, coeff=coeff)
+                y2, d2 = tools.multimoving(x, coeff=coeff)
+                self.assertTrue(np.array_equal(y1, y2))
+                self.assertTrue(np.array_equal(d1, d2))
+
+    def test_multimoving_batched(self):
+        x = get_numbers(5, 30).astype(np.float64)
+        y, d = tools.multimoving(x, coeff=3.)
+        self.assertEqual(y.shape, x.shape)
+        for i, row in enumerate(x):
+            yi, di = tools.multimoving(row, coeff=3.)
+            self.assertTrue(np.array_equal(y[i], yi))
+            self.assertTrue(np.array_equal(d[i], di))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+from spikes import app, db
+from spikes.webcache import Generation, ResponseCache
+
+
+class WebCacheTest(unittest.TestCase):
+
+    def test_get(self):
+        calls = []
+
+        def make():
+            calls.append(1)
+            return '<p>{}</p>'.format(len(calls))
+
+        with app.app_context():
+            Generation.__table__.create(db.engine, checkfirst=True)
+            cache = ResponseCache()
+            key = ('html', 'Firefox', 'nightly', '2018-01-03')
+
+            with app.test_request_context('/'):
+                res = cache.get(key, make)
+                etag, _ = res.get_etag()
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(res.get_data(as_text=True), '<p>1</p>')
+
+            with app.test_request_context('/'):
+                res = cache.get(key, make)
+                self.assertEqual(res.get_data(as_text=True), '<p>1</p>')
+
+            headers = {'If-None-Match': '"{}"'.format(etag)}
+            with app.test_request_context('/', headers=headers):
+                res = cache.get(key, make)
+                self.assertEqual(res.status_code, 304)
+            self.assertEqual(len(calls), 1)
+
+            Generation.bump()
+            with app.test_request_context('/', headers=headers):
+                res = cache.get(key, make)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(res.get_data(as_text=True), '<p>2</p>')
+                self.assertNotEqual(res.get_etag()[0], etag)
+
+
+if __name__ == '__main__':
+    unittest.main()